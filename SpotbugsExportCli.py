@@ -1,14 +1,229 @@
-from sys import argv
+import argparse
+import csv
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-from orangecode.reader.SpotbugsUtil import parse_spotbugs_report
+from orangecode.reader.Schema import DISCRETE, CONTINUOUS, META
+from orangecode.reader.SpotbugsUtil import parse_spotbugs_report, SPOTBUGS_COLUMNS, REPORT_FILE_COLUMN, \
+    is_spotbugs_report, BugFilter, PARSER_BACKENDS, default_backend, diff_spotbugs_reports, STATUS_COLUMN
+from orangecode.reader.ReportFiles import expand_report_paths, report_labels
+
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+FORMATS = ("csv", "tsv", "tab", "jsonl", "npz")
+
+
+def header_name(name, kind, role):
+    """Orange single row header: type and flags prepended to the name (e.g. D#BugType)."""
+    type_flag = {DISCRETE: "D", CONTINUOUS: "C"}.get(kind, "")
+    role_flag = "m" if role == META else ""
+    return "{}{}#{}".format(type_flag, role_flag, name)
+
+
+class CsvWriter:
+    """Delimited output with the one row Orange header."""
+
+    def __init__(self, out, columns, delimiter=","):
+        self.writer = csv.writer(out, delimiter=delimiter, lineterminator="\n")
+        self.write_header(columns)
+
+    def write_header(self, columns):
+        self.writer.writerow([header_name(*column) for column in columns])
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        pass
+
+
+class TabWriter(CsvWriter):
+    """Orange .tab output: names, types and flags header rows."""
+
+    def __init__(self, out, columns):
+        super().__init__(out, columns, delimiter="\t")
+
+    def write_header(self, columns):
+        self.writer.writerow([name for name, _, _ in columns])
+        self.writer.writerow([kind for _, kind, _ in columns])
+        self.writer.writerow(["meta" if role == META else "" for _, _, role in columns])
+
+
+class JsonLinesWriter:
+    def __init__(self, out, columns):
+        self.out = out
+        self.names = [name for name, _, _ in columns]
+
+    def write(self, row):
+        self.out.write(json.dumps(dict(zip(self.names, row))))
+        self.out.write("\n")
+
+    def close(self):
+        pass
+
+
+class NpzWriter:
+    """
+    Compressed columnar output: for each column, the interned codes and
+    values (discrete), the floats (continuous) or the strings.
+    """
+
+    def __init__(self, out, columns):
+        from orangecode.reader.TableBuilder import ColumnarTableBuilder
+        self.out = out
+        self.builder = ColumnarTableBuilder(columns)
+        self.write = self.builder.append
+
+    def close(self):
+        import numpy as np
+        arrays = {}
+        for column in self.builder.columns:
+            if column.kind == DISCRETE:
+                arrays[column.name + ".codes"] = np.frombuffer(column.data, dtype=column.data.typecode).astype(np.int32)
+                arrays[column.name + ".values"] = np.array(column.values, dtype=str)
+            elif column.kind == CONTINUOUS:
+                arrays[column.name] = np.frombuffer(column.data, dtype=float)
+            else:
+                arrays[column.name] = np.array(column.data, dtype=str)
+        np.savez_compressed(self.out, **arrays)
+
+
+def report_rows(filename, report_label=None, bug_filter=None, backend=None):
+    """All the rows of one report (run in worker processes)."""
+    rows = []
+    if report_label is None:
+        parse_spotbugs_report(filename,rows.append,skip=bug_filter,backend=backend)
+    else:
+        parse_spotbugs_report(filename,lambda row: rows.append(row + [report_label]),skip=bug_filter,backend=backend)
+    return rows
+
+
+def export_reports(paths, writer, jobs=1, label_reports=False, bug_filter=None, backend=None):
+    labels = report_labels(paths) if label_reports else [None] * len(paths)
+    bug_filter = bug_filter or None
+
+    if jobs <= 1 or len(paths) <= 1:
+        for path, label in zip(paths, labels):
+            if label is None:
+                parse_spotbugs_report(path,writer.write,skip=bug_filter,backend=backend)
+            else:
+                parse_spotbugs_report(path,lambda row, label=label: writer.write(row + [label]),
+                                      skip=bug_filter,backend=backend)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for rows in executor.map(report_rows, paths, labels, [bug_filter] * len(paths), [backend] * len(paths)):
+            for row in rows:
+                writer.write(row)
+
+
+def open_output(output, output_format):
+    if output_format == "npz":
+        if output in (None, "-"):
+            return open(sys.stdout.fileno(), "wb", closefd=False)
+        return open(output, "wb")
+    if output in (None, "-"):
+        return open(sys.stdout.fileno(), "w", newline="", buffering=OUTPUT_BUFFER_SIZE,
+                    encoding="utf-8", closefd=False)
+    return open(output, "w", newline="", buffering=OUTPUT_BUFFER_SIZE, encoding="utf-8")
+
+
+def create_writer(output_format, out, columns):
+    if output_format == "tsv":
+        return CsvWriter(out, columns, delimiter="\t")
+    if output_format == "tab":
+        return TabWriter(out, columns)
+    if output_format == "jsonl":
+        return JsonLinesWriter(out, columns)
+    if output_format == "npz":
+        return NpzWriter(out, columns)
+    return CsvWriter(out, columns)
 
 
 def handleReport(filename):
-    def print_bug(info):
-        print(",".join(info))
+    with open_output(None, "csv") as out:
+        writer = CsvWriter(out, SPOTBUGS_COLUMNS)
+        parse_spotbugs_report(filename,writer.write)
+
+
+def comma_list(text):
+    return [value.strip() for value in text.split(",") if value.strip()]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Export SpotBugs XML reports to tabular formats.")
+    parser.add_argument("reports", nargs="*",
+                        help="report files (optionally gzip/bz2/xz compressed), zip archives, directories "
+                             "or globs ('-' reads a report from stdin)")
+    parser.add_argument("-l", "--list", metavar="FILE",
+                        help="read report paths from FILE, one per line ('-' for stdin)")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="csv", help="output format (default: csv)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="reports parsed in parallel")
+    parser.add_argument("--pattern", default="*.xml", help="report files searched in directories")
+    parser.add_argument("--baseline", metavar="REPORT",
+                        help="compare the report with an earlier one and add a Status column "
+                             "(new, fixed or unchanged)")
+    parser.add_argument("--parser", choices=list(PARSER_BACKENDS), default=default_backend(),
+                        help="XML parser (default: %(default)s)")
+    filters = parser.add_argument_group("filters", "only export the matching bugs; list options are comma "
+                                                   "separated and may be repeated")
+    filters.add_argument("--min-rank", type=float, help="lowest rank exported (1 is the most severe)")
+    filters.add_argument("--max-rank", type=float, help="highest rank exported")
+    filters.add_argument("--priority", type=comma_list, action="extend", default=[],
+                         help="priorities (1 = high, 2 = normal, 3 = low)")
+    filters.add_argument("--category", type=comma_list, action="extend", default=[],
+                         help="categories, e.g. SECURITY,MALICIOUS_CODE")
+    filters.add_argument("--type", type=comma_list, action="extend", default=[], dest="bug_types",
+                         help="bug types, e.g. SQL_INJECTION_JDBC")
+    filters.add_argument("--prefix", type=comma_list, action="extend", default=[],
+                         help="class name (com.example.) or source path (com/example/) prefixes")
+    args = parser.parse_args(args)
+    bug_filter = BugFilter(args.min_rank, args.max_rank, args.priority, args.category, args.bug_types,
+                           args.prefix) or None
+
+    sources = list(args.reports)
+    if args.list:
+        with (sys.stdin if args.list == "-" else open(args.list)) as f:
+            sources.extend(line.strip() for line in f if line.strip())
+    if not sources:
+        parser.error("no report given")
+
+    from_stdin = "-" in sources
+    paths = expand_report_paths([source for source in sources if source != "-"], args.pattern,
+                                is_spotbugs_report)
+    label_reports = len(paths) + from_stdin > 1
+
+    if args.baseline:
+        if label_reports or not (paths or from_stdin):
+            parser.error("--baseline compares a single report")
+        report = sys.stdin.buffer if from_stdin else paths[0]
+        with open_output(args.output, args.format) as out:
+            writer = create_writer(args.format, out, SPOTBUGS_COLUMNS + [STATUS_COLUMN])
+            counts = diff_spotbugs_reports(report, args.baseline, writer.write, skip=bug_filter,
+                                           backend=args.parser)
+            writer.close()
+        print("{} new, {} fixed, {} unchanged".format(*counts), file=sys.stderr)
+        return
+
+    columns = SPOTBUGS_COLUMNS + [REPORT_FILE_COLUMN] if label_reports else SPOTBUGS_COLUMNS
+    with open_output(args.output, args.format) as out:
+        writer = create_writer(args.format, out, columns)
+        if from_stdin:
+            if label_reports:
+                parse_spotbugs_report(sys.stdin.buffer,lambda row: writer.write(row + ["-"]),skip=bug_filter,
+                                      backend=args.parser)
+            else:
+                parse_spotbugs_report(sys.stdin.buffer,writer.write,skip=bug_filter,backend=args.parser)
+        export_reports(paths, writer, args.jobs, label_reports, bug_filter, args.parser)
+        writer.close()
 
-    print("m#SourceFile,D#BugClass,D#BugMethod,D#BugType,D#Priority,C#Rank,D#Category,D#SinkMethod,D#UnknownSource")
-    parse_spotbugs_report(filename,print_bug)
 
-if(len(argv) > 1):
-    handleReport(argv[1])
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        #Output closed early (e.g. piped to head)
+        sys.stderr.close()
+        sys.exit(1)
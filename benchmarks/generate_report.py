@@ -0,0 +1,97 @@
+"""
+Deterministic generator of synthetic SpotBugs XML reports.
+
+    python benchmarks/generate_report.py report.xml --bugs 100000
+"""
+import argparse
+import random
+from xml.sax.saxutils import quoteattr
+
+CATEGORIES = ["SECURITY", "MALICIOUS_CODE", "BAD_PRACTICE", "CORRECTNESS", "PERFORMANCE", "STYLE"]
+SINKS = [
+    "java/sql/Statement.executeQuery(Ljava/lang/String;)Ljava/sql/ResultSet;",
+    "java/io/File.<init>(Ljava/lang/String;)V",
+    "java/lang/Runtime.exec(Ljava/lang/String;)Ljava/lang/Process;",
+    "javax/servlet/http/HttpServletResponse.sendRedirect(Ljava/lang/String;)V",
+]
+SOURCES = [
+    "javax/servlet/ServletRequest.getParameter(Ljava/lang/String;)Ljava/lang/String;",
+    "java/util/Properties.getProperty(Ljava/lang/String;)Ljava/lang/String;",
+]
+
+
+def _class_name(i):
+    return "com.example.module{}.pkg{}.Class{}".format(i % 17, i % 5, i)
+
+
+def generate_report(out, bugs=10000, classes=1000, types=60, strings=2, source_lines=2, seed=0):
+    """
+    Write a SpotBugs report with `bugs` BugInstances spread over `classes`
+    classes and `types` bug types to the text stream `out`. Each bug has
+    `strings` taint String elements and `source_lines` SourceLine elements.
+    The output only depends on the arguments.
+    """
+    rnd = random.Random(seed)
+    bug_types = ["BUG_TYPE_{}".format(i) for i in range(types)]
+    package_counts = {}
+
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    out.write('<BugCollection version="4.7.3" sequence="0" timestamp="0" analysisTimestamp="0" release="">\n')
+    out.write('  <Project projectName="synthetic">\n    <Jar>/synthetic/target/classes</Jar>\n  </Project>\n')
+
+    for i in range(bugs):
+        class_index = rnd.randrange(classes)
+        class_name = _class_name(class_index)
+        package = class_name.rsplit(".", 1)[0]
+        package_counts[package] = package_counts.get(package, 0) + 1
+        source_path = class_name.replace(".", "/") + ".java"
+        source_file = source_path.rsplit("/", 1)[1]
+        method = "method{}".format(rnd.randrange(20))
+        line = rnd.randrange(1, 2000)
+
+        out.write('  <BugInstance type="{}" priority="{}" rank="{}" abbrev="SYN" category="{}" '
+                  'instanceHash="{:032x}" instanceOccurrenceNum="0" instanceOccurrenceMax="0">\n'.format(
+                      rnd.choice(bug_types), rnd.randrange(1, 4), rnd.randrange(1, 21),
+                      rnd.choice(CATEGORIES), rnd.getrandbits(128)))
+        out.write('    <Class classname="{0}"><SourceLine classname="{0}" sourcefile="{1}" sourcepath="{2}"/></Class>\n'
+                  .format(class_name, source_file, source_path))
+        out.write('    <Method classname="{0}" name="{1}" signature="(Ljava/lang/String;I)V" isStatic="false">'
+                  '<SourceLine classname="{0}" start="{2}" end="{3}" sourcefile="{4}" sourcepath="{5}"/></Method>\n'
+                  .format(class_name, method, max(1, line - 10), line + 10, source_file, source_path))
+        for j in range(source_lines):
+            out.write('    <SourceLine classname="{0}" start="{1}" end="{1}" sourcefile="{2}" sourcepath="{3}"/>\n'
+                      .format(class_name, line + j, source_file, source_path))
+        for j in range(strings):
+            if j % 2 == 0:
+                role, value = "Sink method", rnd.choice(SINKS)
+            else:
+                role, value = "Unknown source", rnd.choice(SOURCES)
+            out.write('    <String role={} value={}/>\n'.format(quoteattr(role), quoteattr(value)))
+        out.write('  </BugInstance>\n')
+
+    out.write('  <Errors errors="0" missingClasses="0"></Errors>\n')
+    out.write('  <FindBugsSummary timestamp="0" total_classes="{}" referenced_classes="{}" total_bugs="{}" '
+              'total_size="{}" num_packages="{}">\n'.format(classes, classes, bugs, classes * 100, len(package_counts)))
+    for package in sorted(package_counts):
+        out.write('    <PackageStats package="{}" total_bugs="{}" total_types="{}" total_size="0"/>\n'
+                  .format(package, package_counts[package], classes))
+    out.write('  </FindBugsSummary>\n</BugCollection>\n')
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic SpotBugs XML report.")
+    parser.add_argument("output")
+    parser.add_argument("--bugs", type=int, default=10000)
+    parser.add_argument("--classes", type=int, default=1000)
+    parser.add_argument("--types", type=int, default=60)
+    parser.add_argument("--strings", type=int, default=2, help="taint String elements per bug")
+    parser.add_argument("--source-lines", type=int, default=2, help="SourceLine elements per bug")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(args)
+
+    with open(args.output, "w", encoding="utf-8") as out:
+        generate_report(out, args.bugs, args.classes, args.types, args.strings, args.source_lines, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Time each stage of loading a SpotBugs report and record wall time and peak
+memory to a JSON file that can be compared across commits.
+
+    python benchmarks/run_benchmarks.py --bugs 10000 100000 -o results.json
+    python benchmarks/run_benchmarks.py --compare baseline.json results.json
+
+Peak memory is measured with tracemalloc in a separate run of each stage,
+so it does not inflate the wall times.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_report import generate_report
+from orangecode.reader.SpotbugsUtil import default_backend
+
+
+def parse_stage(filename, backend=None):
+    from orangecode.reader.SpotbugsUtil import parse_spotbugs_report
+    rows = []
+    parse_spotbugs_report(filename, rows.append, backend=backend)
+    return rows
+
+
+def table_stage(rows):
+    #The builder SpotbugsReader.read uses to turn the rows into a table
+    from orangecode.reader.SpotbugsUtil import SPOTBUGS_COLUMNS
+    from orangecode.reader.TableBuilder import ColumnarTableBuilder
+    builder = ColumnarTableBuilder(SPOTBUGS_COLUMNS)
+    for row in rows:
+        builder.append(row)
+    return builder.to_table()
+
+
+def read_stage(filename):
+    from orangecode.reader.SpotbugsReader import SpotbugsReader
+    return SpotbugsReader(filename).read()
+
+
+def widget_stage(filename):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from AnyQt.QtWidgets import QApplication
+    from orangecode.OWSastFile import OWSastFile
+
+    app = QApplication.instance() or QApplication([])
+    widget = OWSastFile()
+    widget.use_cache = False
+    widget.add_path(filename)
+    widget.load_data(force=True)
+    while widget.task is not None:
+        app.processEvents()
+        time.sleep(0.001)
+    app.processEvents()
+    data = widget.data
+    errors = [str(msg) for msg in widget.Error.active]
+    widget.onDeleteWidget()
+    if data is None:
+        raise RuntimeError("widget loaded no data from {}: {}".format(
+            filename, "; ".join(errors) or "no error shown"))
+    return len(data)
+
+
+def cli_stage(filename):
+    from SpotbugsExportCli import CsvWriter, export_reports
+    from orangecode.reader.SpotbugsUtil import SPOTBUGS_COLUMNS
+    with open(os.devnull, "w", newline="") as out:
+        export_reports([filename], CsvWriter(out, SPOTBUGS_COLUMNS))
+
+
+def measure(function, *args, repeat=3):
+    """Best wall time over `repeat` runs and tracemalloc peak of one more run."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"wall_time": min(times), "peak_memory": peak}
+
+
+def run(sizes, repeat, stages, workdir, backend=None):
+    results = []
+    for bugs in sizes:
+        filename = os.path.join(workdir, "spotbugs-{}.xml".format(bugs))
+        with open(filename, "w", encoding="utf-8") as out:
+            generate_report(out, bugs=bugs, classes=max(10, bugs // 10))
+        rows = parse_stage(filename)
+
+        stage_functions = {
+            "parse": (partial(parse_stage, backend=backend), filename),
+            "table": (table_stage, rows),
+            "read": (read_stage, filename),
+            "widget": (widget_stage, filename),
+            "cli": (cli_stage, filename),
+        }
+        for stage in stages:
+            function, arg = stage_functions[stage]
+            try:
+                result = measure(function, arg, repeat=repeat)
+            except Exception as ex:
+                result = {"error": "{}: {}".format(type(ex).__name__, ex)}
+            result.update(stage=stage, bugs=bugs, file_size=os.path.getsize(filename))
+            if "wall_time" in result:
+                result["bugs_per_second"] = bugs / max(result["wall_time"], 1e-9)
+            results.append(result)
+            print("{stage:>10} {bugs:>9} bugs: ".format(**result) +
+                  ("{wall_time:8.3f} s {peak_memory:>14,d} B".format(**result)
+                   if "error" not in result else result["error"]), file=sys.stderr)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_file, results_file, threshold):
+    """Print the ratio of each stage to the baseline; return True on regression."""
+    with open(baseline_file) as f:
+        baseline = {(r["stage"], r["bugs"]): r for r in json.load(f)["results"] if "error" not in r}
+    with open(results_file) as f:
+        results = [r for r in json.load(f)["results"] if "error" not in r]
+
+    regression = False
+    for result in results:
+        base = baseline.get((result["stage"], result["bugs"]))
+        if base is None:
+            continue
+        time_ratio = result["wall_time"] / base["wall_time"]
+        memory_ratio = result["peak_memory"] / max(base["peak_memory"], 1)
+        flag = ""
+        if time_ratio > 1 + threshold or memory_ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regression = True
+        print("{:>10} {:>9} bugs: time x{:.2f}  memory x{:.2f}{}".format(
+            result["stage"], result["bugs"], time_ratio, memory_ratio, flag))
+    return regression
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Benchmark SpotBugs report loading.")
+    parser.add_argument("--bugs", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="report sizes, in bugs")
+    parser.add_argument("--stages", nargs="+", default=["parse", "table", "read", "widget", "cli"],
+                        choices=["parse", "table", "read", "widget", "cli"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--parser", help="XML parser of the parse stage (etree or lxml; default: fastest installed)")
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown reported as a regression (default: 0.1)")
+    args = parser.parse_args(args)
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(args.bugs, args.repeat, args.stages, workdir, args.parser)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parser": args.parser or default_backend(),
+            "timestamp": time.time(),
+            "results": results,
+        }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
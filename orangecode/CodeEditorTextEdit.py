@@ -70,6 +70,8 @@ class CodeEditorTextEdit(QPlainTextEdit):
         self._locals = {}
         self._echo = True
         self._show_line_numbers = True
+        #Number shown for the first block (documents may hold a window of a file)
+        self._first_line_number = 1
 
         # helps prevent unnecessary redraws of the line number area later.
         # See the Qt docs example for line numbers in text edit widgets:
@@ -82,7 +84,10 @@ class CodeEditorTextEdit(QPlainTextEdit):
         self.setTextInteractionFlags(Qt.TextEditorInteraction)
         self.setWordWrapMode(QTextOption.NoWrap)
 
-        self.set_highlighter(".py")
+        #Shown when there is no file; the documents of files are swapped in (see show_document)
+        self._empty_document, self._empty_highlighter = self.new_document("", ".py")
+        self.setDocument(self._empty_document)
+        self._syntax_highlighter = self._empty_highlighter
 
         self._line_number_area = _LineNumberArea(self)
 
@@ -113,18 +118,60 @@ class CodeEditorTextEdit(QPlainTextEdit):
 
     def set_highlighter(self,language):
         print("Changing language view to "+language)
+        self._syntax_highlighter = self.create_highlighter(language, self.document())
+
+        #self._syntax_highlighter.setDocument(self.document())
+
+    @staticmethod
+    def create_highlighter(language, document):
+        """Syntax highlighter of `document` for files of extension `language`."""
         if language == ".py":
-            self._syntax_highlighter = PythonHighlighter(self.document())
+            return PythonHighlighter(document)
         elif language == ".cs":
-            self._syntax_highlighter = CsHighlighter(self.document())
+            return CsHighlighter(document)
         elif language == ".java":
-            self._syntax_highlighter = CsHighlighter(self.document())
+            return CsHighlighter(document)
         elif language == ".cpp":
-            self._syntax_highlighter = CsHighlighter(self.document())
+            return CsHighlighter(document)
         else:
-            self._syntax_highlighter = NoneHighlighter(self.document())
+            return NoneHighlighter(document)
 
-        #self._syntax_highlighter.setDocument(self.document())
+    def new_document(self, text, language):
+        """
+        Highlighted document holding `text` (see show_document); returns
+        (document, highlighter). The document is owned by the editor.
+        """
+        document = QTextDocument(self)
+        document.setDocumentLayout(QPlainTextDocumentLayout(document))
+        document.setDefaultFont(self.font())
+        highlighter = self.create_highlighter(language, document)
+        document.setPlainText(text)
+        return document, highlighter
+
+    def show_document(self, document, highlighter, first_line_number=1):
+        """
+        Display a document made by new_document, keeping its layout and
+        highlighting. The line numbers start at `first_line_number`.
+        """
+        document.setDefaultFont(self.font())
+        self.setDocument(document)
+        self._syntax_highlighter = highlighter
+        self.set_first_line_number(first_line_number)
+        self.highlight_current_line()
+
+    def first_line_number(self):
+        return self._first_line_number
+
+    def set_first_line_number(self, number):
+        """Number the lines of the document from `number`."""
+        self._first_line_number = number
+        self._update_line_number_area_width(0)
+        self._line_number_area.update()
+
+    def clear_document(self):
+        """Display an empty document (the documents shown before are left untouched)."""
+        self.show_document(self._empty_document, self._empty_highlighter)
+        self._empty_document.clear()
 
     def add_globals(self, new_globals):
         """
@@ -166,7 +213,7 @@ class CodeEditorTextEdit(QPlainTextEdit):
         """Calculate the width of the line number area."""
 
         if self._show_line_numbers:
-            digits = math.floor(math.log10(self.blockCount())) + 1
+            digits = math.floor(math.log10(self.blockCount() + self._first_line_number - 1)) + 1
             return 6 + self.fontMetrics().width('8') * digits
         else:
             return 0
@@ -212,7 +259,7 @@ class CodeEditorTextEdit(QPlainTextEdit):
 
             if block.isVisible() and bottom >= line_num_rect.top():
 
-                num = str(block_num + 1)
+                num = str(block_num + self._first_line_number)
                 painter.setPen(self._line_number_color())
                 painter.drawText(
                     -2, top,
@@ -0,0 +1,102 @@
+"""
+Lightweight instrumentation of report and source loading: per-stage wall
+time, row counts and (optionally) peak Python allocations, reported through
+the `orangecode.perf` logger and in the widgets' Info box.
+"""
+import cProfile
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+log = logging.getLogger("orangecode.perf")
+
+
+class LoadProfile:
+    """
+    Measurements of one load, recorded stage by stage.
+
+    With `trace_memory`, tracemalloc runs during the load and the peak
+    allocation of each stage is recorded (this slows the load down). With
+    `profile_path`, the code run inside `profiled()` is traced by cProfile
+    and the statistics are dumped to that file.
+    """
+
+    def __init__(self, name, trace_memory=False, profile_path=None):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.profile_path = profile_path
+        self.stages = []
+        self.info = {}
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Record the duration (and peak memory) of the enclosed block."""
+        record = {"stage": name, "rows": rows}
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["duration"] = time.perf_counter() - start
+            if self.trace_memory:
+                record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+            self.stages.append(record)
+
+    @contextmanager
+    def profiled(self):
+        """Trace the enclosed block with cProfile if a profile path was given."""
+        if self.profile_path is None:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(self.profile_path)
+
+    def total(self):
+        return sum(record["duration"] for record in self.stages)
+
+    def as_dict(self):
+        return {"load": self.name, "info": self.info, "stages": self.stages}
+
+    def emit(self):
+        """Log the measurements as one JSON record."""
+        data = self.as_dict()
+        log.info("%s", json.dumps(data, default=str), extra={"orangecode_profile": data})
+
+    def describe(self):
+        """HTML summary for an Info box."""
+        lines = []
+        for record in self.stages:
+            line = "{}: {:.3f} s".format(record["stage"], record["duration"])
+            if record.get("rows") is not None:
+                line += ", {} rows".format(record["rows"])
+            if record.get("peak_memory") is not None:
+                line += ", peak {:.1f} MB".format(record["peak_memory"] / 2 ** 20)
+            lines.append(line)
+        lines += ["{}: {}".format(key, value) for key, value in self.info.items()]
+        return "<p>{}</p>".format("<br/>".join(lines))
+
+
+def stage(profile, name, rows=None):
+    """`profile.stage(...)`, or a no-op when there is no profile."""
+    if profile is None:
+        return _no_stage()
+    return profile.stage(name, rows)
+
+
+@contextmanager
+def _no_stage():
+    yield {}
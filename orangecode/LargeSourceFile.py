@@ -0,0 +1,54 @@
+"""
+Source files too large to be loaded whole in the Code Viewer: the file is
+memory-mapped and only the lines around the bug are decoded and displayed.
+"""
+import mmap
+import os
+
+import numpy as np
+
+#Bytes scanned at once when indexing the lines
+INDEX_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+class LargeSourceFile:
+    """
+    Memory-mapped file with the offsets of its lines, found in one
+    vectorized pass over the bytes. Lines are numbered from 0 and decoded
+    only when asked for.
+    """
+
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        with open(path, "rb") as file:
+            self.size = os.fstat(file.fileno()).st_size
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        #offsets[i] is where line i starts; offsets[-1] is the end of the file
+        self.offsets = self._index()
+
+    def _index(self):
+        data = np.frombuffer(self._map, dtype=np.uint8)
+        starts = [np.flatnonzero(data[start:start + INDEX_CHUNK_SIZE] == ord("\n")) + (start + 1)
+                  for start in range(0, self.size, INDEX_CHUNK_SIZE)]
+        del data
+        offsets = np.concatenate([np.zeros(1, dtype=np.int64)] + starts)
+        if offsets[-1] != self.size:
+            offsets = np.append(offsets, self.size)
+        return offsets
+
+    @property
+    def line_count(self):
+        return len(self.offsets) - 1
+
+    def lines(self, start, stop):
+        """Text of lines `start` to `stop` (excluded), without the last line break."""
+        start = min(max(start, 0), self.line_count)
+        stop = min(max(stop, start), self.line_count)
+        text = self._map[self.offsets[start]:self.offsets[stop]].decode(self.encoding, errors="replace")
+        text = text.replace("\r\n", "\n")
+        return text[:-1] if text.endswith("\n") else text
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
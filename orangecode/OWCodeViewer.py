@@ -3,6 +3,7 @@ import numpy
 from orangecode.CodeEditorTextEdit import CodeEditorTextEdit
 
 import AnyQt.QtCore
+from AnyQt.QtCore import QFileSystemWatcher
 from AnyQt.QtGui import (
     QColor, QBrush, QPalette, QFont, QTextDocument,
     QSyntaxHighlighter, QTextCharFormat, QTextCursor, QKeySequence,
@@ -15,6 +16,8 @@ from AnyQt.QtWidgets import (
 import Orange.data
 from Orange.widgets.widget import OWWidget, Input, Output
 from Orange.widgets import gui
+from Orange.widgets.settings import Setting
+from Orange.widgets.utils.concurrent import FutureWatcher
 #from repr import repr
 
 from Orange.data import Table,Variable,Domain,ContinuousVariable, DiscreteVariable, StringVariable
@@ -22,19 +25,86 @@ from numpy import float64
 from numpy import nan
 
 import os, math
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import code
-import itertools
 import re
 
+from orangecode.Instrumentation import LoadProfile, stage
+from orangecode.reader.SourceLocation import find_location_columns, row_location, prefetch_paths
+from orangecode.SourceDocumentCache import SourceDocumentCache, file_stamp, BYTES_PER_CHAR
+from orangecode.LargeSourceFile import LargeSourceFile
+from orangecode.SourceIndex import open_index, split_roots, log as index_log
+
+#Domains whose location columns are remembered
+MAX_CACHED_DOMAINS = 32
+
+#Files read ahead when a dataset arrives: those of the rows following the
+#displayed one and the most frequent ones
+PREFETCH_ROWS = 8
+PREFETCH_FILES = 8
+
+
+#Directories of the source index watched for changes (each uses an inotify watch on Linux)
+MAX_WATCHED_DIRECTORIES = 8192
+
+#Lines displayed around the bug in large files, and added when scrolling past them
+WINDOW_LINES = 2000
+EXTEND_LINES = 1000
+
+
+def read_source(path, known_stamp=None, profile=None, large_size=None, index_large=True):
+    """
+    (stamp, text) of the file at `path`, run in a worker thread. The text is
+    None when the file still has `known_stamp` (see file_stamp). Files of
+    `large_size` bytes or more are not read but indexed (LargeSourceFile),
+    or skipped (None) without `index_large`.
+    """
+    stamp = file_stamp(path)
+    if stamp == known_stamp:
+        return stamp, None
+    if large_size is not None and stamp[0] >= large_size:
+        if not index_large:
+            return stamp, None
+        with stage(profile, "index") as record:
+            source = LargeSourceFile(path)
+            record["rows"] = source.line_count
+        return stamp, source
+    with stage(profile, "read") as record:
+        with open(path,'r') as file:
+            code = file.read()
+        record["rows"] = code.count("\n")
+    return stamp, code
+
+class SourceWindow:
+    """Document displaying the lines `first` to `end` (excluded) of a LargeSourceFile."""
+
+    def __init__(self, path, stamp, source, document, highlighter):
+        self.path = path
+        self.stamp = stamp
+        self.source = source
+        self.document = document
+        self.highlighter = highlighter
+        self.first = 0
+        self.end = 0
+
+
 class OWCodeViewer(OWWidget):
     name = "Code Viewer"
     description = "Display"
     icon = "icons/Code.svg"
     priority = 10
     keywords = ["source", "code", "display" ,"programming"]
-    directory = ""
+    #Source directories, separated by ';'
+    directory = Setting("")
 
     show_configuration = False
+    show_statistics = Setting(False)
+    #Columns holding the source location ("" to detect them)
+    file_column = Setting("")
+    line_column = Setting("")
+    source_cache_mb = Setting(64)
+    large_file_mb = Setting(16)
 
     class Inputs:
         data = Input("Source Code", Orange.data.Table)
@@ -62,7 +132,54 @@ class OWCodeViewer(OWWidget):
         self.controlArea.layout().addWidget(self.configMoreButton)
 
         self.configurationBox = gui.widgetBox(self.controlArea, "Configuration")
-        gui.lineEdit(self.configurationBox, self, 'directory','Source Directory',callback=self.directory_changed)
+        gui.lineEdit(self.configurationBox, self, 'directory','Source Directories (separated by ;)',
+                     callback=self.directory_changed)
+        gui.lineEdit(self.configurationBox, self, 'file_column', 'File column (empty to detect)',
+                     callback=self.location_columns_changed)
+        gui.lineEdit(self.configurationBox, self, 'line_column', 'Line column (if not in the file column)',
+                     callback=self.location_columns_changed)
+        gui.spin(self.configurationBox, self, 'source_cache_mb', 0, 4096, step=16,
+                 label='Cache of opened files (MB)', callback=self.source_cache_changed)
+        gui.spin(self.configurationBox, self, 'large_file_mb', 1, 4096,
+                 label='Show a window of the files larger than (MB)')
+        gui.checkBox(self.configurationBox, self, 'show_statistics', 'Show load statistics')
+        self.documents = SourceDocumentCache(self.source_cache_mb * 1024 * 1024, self.release_document)
+        #Text of files read ahead, made into documents when they are displayed
+        self.texts = SourceDocumentCache(self.source_cache_mb * 1024 * 1024)
+        #Files are read in worker threads (sources are often on network shares);
+        #read-ahead has its own pool so that it never delays a selection
+        self._reader = ThreadPoolExecutor(max_workers=2)
+        self._prefetcher = ThreadPoolExecutor(max_workers=2)
+        self._prefetches = []
+        #Number of the latest file request; results of earlier ones are not displayed
+        self._request = 0
+        #Reads of the source files requested, cancelled while queued when superseded
+        self._reads = []
+        #SourceWindow of the last large file displayed
+        self._large = None
+        #Document dropped from the cache while it was displayed (see release_document)
+        self._released = None
+        self.source_file = ""
+        self.source_line = -1
+        #Row whose source is displayed
+        self._line = None
+        #Path of the file requested last
+        self._path = None
+
+        #Index of the source directories, built or loaded in the background
+        #and kept up to date by the watcher
+        self.source_index = None
+        self._index_changed = False
+        self._index_request = 0
+        self._indexer = ThreadPoolExecutor(max_workers=1)
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._source_directory_changed)
+        self.index_sources()
+        self.code_editor.verticalScrollBar().valueChanged.connect(self._extend_window)
+        self.profile = None
+        self.data = None
+        #Domain -> (file variable, line variable) detected by find_location_columns
+        self._location_columns = {}
         self.refresh_configuration_box()
 
         #Test data
@@ -83,6 +200,8 @@ class OWCodeViewer(OWWidget):
 
     @Inputs.data
     def set_data(self, dataset):
+        self.data = dataset
+        self._line = None
         if dataset is not None:
             if(len(dataset) < 1):
                 self.display_no_source_selected()
@@ -90,72 +209,371 @@ class OWCodeViewer(OWWidget):
                 #import code
                 #code.interact(local=dict(globals(), **locals()))
                 self.process_line(dataset[0])
+                self.prefetch(dataset)
         else:
             self.display_no_source_selected()
 
+    def onDeleteWidget(self):
+        self._reader.shutdown(wait=False, cancel_futures=True)
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
+        self._indexer.shutdown(wait=False, cancel_futures=True)
+        if self._large is not None:
+            self._large.source.close()
+        if self.source_index is not None and self._index_changed:
+            try:
+                self.source_index.save()
+            except OSError as ex:
+                index_log.warning("Unable to save the source index: %s", ex)
+        super().onDeleteWidget()
+
     def directory_changed(self):
-        self.code_editor.setPlainText("")
+        self.code_editor.clear_document()
+        self._drop_released()
+        self.profile = LoadProfile("source")
+        self.index_sources()
         self.update_source_file()
 
-    def process_line(self,line):
+    # Source directories
+
+    def index_sources(self):
         """
-        The extraction is based on values to avoid manual configuration.
+        Index the source directories in the background (see
+        SourceIndex.open_index); until the index is ready, reported paths
+        are taken as relative to the first directory.
         """
+        self._index_request += 1
+        request = self._index_request
+        self.source_index = None
+        self._index_changed = False
+        if self._watcher.directories():
+            self._watcher.removePaths(self._watcher.directories())
+        roots = split_roots(self.directory)
+        if not roots:
+            return
+        future = self._indexer.submit(open_index, roots)
+        self._watch(future, partial(self._sources_indexed, request))
 
-        self.source_file = ""
-        self.source_line = -1
+    def _sources_indexed(self, request, future):
+        if request != self._index_request or future.cancelled():
+            return
+        if future.exception() is not None:
+            index_log.warning("Unable to index the sources: %s", future.exception())
+            return
+        self.source_index = future.result()
+        directories = list(self.source_index.directories)[:MAX_WATCHED_DIRECTORIES]
+        if directories:
+            self._watcher.addPaths(directories)
+        #Display the file the index finds if another one was tried
+        if self.source_file and self.resolve_path(self.source_file) != self._path:
+            self.update_source_file()
+
+    def _source_directory_changed(self, directory):
+        #Listed in the background: a new subtree (e.g. after a checkout) is scanned entirely
+        if self.source_index is None:
+            return
+        future = self._indexer.submit(self.source_index.list_directory, directory)
+        self._watch(future, partial(self._source_directory_listed, self._index_request))
 
-        #code.interact(local=locals())
+    def _source_directory_listed(self, request, future):
+        if request != self._index_request or future.cancelled() or self.source_index is None:
+            return
+        if future.exception() is not None:
+            index_log.warning("Unable to list a source directory: %s", future.exception())
+            return
+        before = set(self.source_index.directories)
+        self.source_index.apply_listing(*future.result())
+        after = set(self.source_index.directories)
+        self._index_changed = True
+        removed = [path for path in before - after if path in self._watcher.directories()]
+        if removed:
+            self._watcher.removePaths(removed)
+        room = MAX_WATCHED_DIRECTORIES - len(self._watcher.directories())
+        added = sorted(after - before)[:max(room, 0)]
+        if added:
+            self._watcher.addPaths(added)
+
+    def source_cache_changed(self):
+        for cache in (self.documents, self.texts):
+            cache.budget = self.source_cache_mb * 1024 * 1024
+            cache.evict()
+
+    def release_document(self, item):
+        document, _ = item
+        if document is not self.code_editor.document():
+            document.deleteLater()
+        else:
+            #Still displayed: deleted once another document is shown
+            self._released = document
 
-        all_attributes_index = []
+    def _drop_released(self):
+        """Delete the document released by the cache while displayed, once it is replaced."""
+        if self._released is not None and self._released is not self.code_editor.document():
+            self._released.deleteLater()
+            self._released = None
 
-        #Guessing based on values
-        for var in itertools.chain(line.domain.attributes,line.domain.metas):
-            i = line.domain.index(var.name)
-            #print("{} -> {}".format(var.name,i))
-            all_attributes_index.append(i)
+    def location_columns_changed(self):
+        #Locate the row displayed with the new columns
+        if self._line is not None:
+            self.process_line(self._line)
 
-        for attribute_index in all_attributes_index:
-            try:
-                line[attribute_index]
-            except IndexError:
-                print("More attributes than values on line {}".format(line))
-                continue
+    def location_columns(self, domain, data):
+        """
+        (file variable, line variable) of the source location in `domain`:
+        the columns set in the configuration if it has them, otherwise the
+        columns detected from `data` the first time the domain is seen.
+        None when there is no location.
+        """
+        if self.file_column and self.file_column in domain:
+            line_var = domain[self.line_column] if self.line_column and self.line_column in domain else None
+            return domain[self.file_column], line_var
+        if domain not in self._location_columns:
+            if len(self._location_columns) >= MAX_CACHED_DOMAINS:
+                self._location_columns.clear()
+            self._location_columns[domain] = find_location_columns(data)
+        return self._location_columns[domain]
 
-            if(line[attribute_index] is not None):
-                val = line[attribute_index].value
-                if type(val) is str:
-                    val_parts = val.split(":")
-                    if(len(val_parts) == 2):
-                        if(val_parts[1].isnumeric()):
-                            self.source_file = val_parts[0]
-                            self.source_line = int(val_parts[1])
+    def process_line(self,line):
+        """
+        The extraction is based on values to avoid manual configuration:
+        the location columns are detected once per domain (see
+        SourceLocation.find_location_columns) unless they are configured.
+        """
+
+        self._line = line
+        self.source_file = ""
+        self.source_line = -1
+        self.profile = LoadProfile("source")
+
+        with stage(self.profile, "locate"):
+            data = getattr(line, "table", None)
+            if data is None:
+                data = Table.from_list(line.domain, [line])
+            location = self.location_columns(line.domain, data)
+            if location is not None:
+                self.source_file, self.source_line = row_location(line, *location)
 
         self.update_source_file()
 
     def update_source_file(self):
         if(self.source_file != ""):
-            #Update highlighter
-            filename, extension = os.path.splitext(self.source_file)
-            self.code_editor.set_highlighter(extension)
+            self.show_source(self.resolve_path(self.source_file))
+        else:
+            self._new_request()
+            self.display_no_source_selected()
 
-            try:
-                with open(self.directory+"/"+self.source_file,'r') as file:
-                    code = file.read()
-                    self.code_editor.setPlainText(code)
+    def _new_request(self):
+        """
+        Number of a new file request. The reads of the earlier requests still
+        queued are cancelled; those already running complete and their text
+        is kept (see _source_read).
+        """
+        for future in self._reads:
+            future.cancel()
+        self._reads = [future for future in self._reads if not future.done()]
+        self._request += 1
+        return self._request
+
+    def _read(self, request, path, known_stamp=None):
+        """Read the file at `path` in the background for `request` (see read_source)."""
+        future = self._reader.submit(read_source, path, known_stamp, self.profile,
+                                     self.large_file_mb * 1024 * 1024)
+        self._reads.append(future)
+        self._watch(future, partial(self._source_read, request, path))
+
+    def resolve_path(self, source_file):
+        """
+        Path of a reported source file: the indexed file sharing the longest
+        path suffix with it, else the file relative to the first source
+        directory.
+        """
+        if self.source_index is not None:
+            path = self.source_index.resolve(source_file)
+            if path is not None:
+                return path
+        roots = split_roots(self.directory)
+        if not roots:
+            return os.path.normpath(source_file)
+        return os.path.normpath(roots[0]+"/"+source_file.replace("\\", "/"))
+
+    def show_source(self, path):
+        """
+        Display the file at `path`. A cached document of the file, or one
+        made from text read ahead, is displayed at once and checked against
+        the file in the background. Otherwise the file is read in the
+        background while "Loading..." is shown. A request superseded by
+        another selection is cancelled if its read is still queued, and its
+        result is not displayed otherwise.
+        """
+        request = self._new_request()
+        self._path = path
+        if self._large is not None and self._large.path == path:
+            self._show_window(self.source_line)
+            self.source_shown()
+            self._read(request, path, self._large.stamp)
+            return
 
-                self.display_source_file()
-            except IOError:
-                _, err, _ = sys.exc_info()
-                self.display_error(str(err))
+        cached = self.documents.lookup(path)
+        if cached is None:
+            read = self.texts.lookup(path)
+            if read is not None:
+                cached = read[0], self._cache_document(path, *read)
+        if self.profile is not None:
+            self.profile.info["cached"] = cached is not None
+
+        if cached is None:
+            known_stamp = None
+            self.display_loading()
         else:
-            self.display_no_source_selected()
+            known_stamp, item = cached
+            self._display_document(item)
+            self.source_shown()
+        self._read(request, path, known_stamp)
+
+    def _source_read(self, request, path, future):
+        if future.cancelled():
+            return
+        try:
+            stamp, code = future.result()
+        except (OSError, ValueError) as err:
+            if request == self._request:
+                self.display_error(str(err))
+            return
+        if code is None:
+            return
+        if isinstance(code, LargeSourceFile):
+            if request != self._request:
+                code.close()
+                return
+            self.documents.discard(path)
+            self._set_large(path, stamp, code)
+            self.source_shown()
+            return
+        if request != self._request:
+            #Superseded: keep the text in case the file is selected again
+            self.texts.put(path, stamp, code, len(code))
+            return
+        self._display_document(self._cache_document(path, stamp, code))
+        self.source_shown()
+
+    def _cache_document(self, path, stamp, code):
+        with stage(self.profile, "display"):
+            _, extension = os.path.splitext(path)
+            item = self.code_editor.new_document(code, extension)
+        self.documents.put(path, stamp, item, len(code) * BYTES_PER_CHAR)
+        self.texts.discard(path)
+        return item
+
+    def _display_document(self, item):
+        if item[0] is not self.code_editor.document():
+            with stage(self.profile, "display"):
+                self.code_editor.show_document(*item)
+            self._drop_released()
+
+    # Large files
+
+    def _set_large(self, path, stamp, source):
+        """Display `source`, a LargeSourceFile, by windows around the bug."""
+        _, extension = os.path.splitext(path)
+        previous = self._large
+        self._large = SourceWindow(path, stamp, source, *self.code_editor.new_document("", extension))
+        self._show_window(self.source_line)
+        if previous is not None:
+            previous.source.close()
+            previous.document.deleteLater()
+
+    def _show_window(self, line):
+        """Display the lines of the large file around `line` (from 1), unless they are shown."""
+        window = self._large
+        source = window.source
+        line = max(line, 1)
+        if not (window.first < line <= window.end and window.document is self.code_editor.document()):
+            with stage(self.profile, "display", WINDOW_LINES):
+                window.first = max(0, min(line - 1 - WINDOW_LINES // 2, source.line_count - WINDOW_LINES))
+                window.end = min(window.first + WINDOW_LINES, source.line_count)
+                window.document.setPlainText(source.lines(window.first, window.end))
+                self.code_editor.show_document(window.document, window.highlighter, window.first + 1)
+                self._drop_released()
+        if self.profile is not None:
+            self.profile.info["window"] = "lines {}-{} of {}".format(window.first + 1, window.end,
+                                                                     source.line_count)
+
+    def _extend_window(self, value):
+        """Add lines to the window of the large file when it is scrolled to one of its ends."""
+        window = self._large
+        if window is None or window.document is not self.code_editor.document():
             return
+        source = window.source
+        scroll_bar = self.code_editor.verticalScrollBar()
+        if value == scroll_bar.minimum() and window.first > 0:
+            start = max(0, window.first - EXTEND_LINES)
+            cursor = QTextCursor(window.document)
+            cursor.movePosition(QTextCursor.Start)
+            cursor.insertText(source.lines(start, window.first) + "\n")
+            added = window.first - start
+            window.first = start
+            self.code_editor.set_first_line_number(start + 1)
+            scroll_bar.setValue(scroll_bar.value() + added)
+        elif value == scroll_bar.maximum() and window.end < source.line_count:
+            stop = min(source.line_count, window.end + EXTEND_LINES)
+            cursor = QTextCursor(window.document)
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText("\n" + source.lines(window.end, stop))
+            window.end = stop
+
+    def source_shown(self):
+        """Update the info and the cursor once the requested file is displayed."""
+        self.display_source_file()
         if(self.source_line != -1):
             #print(self.source_line)
-            block = self.code_editor.document().findBlockByLineNumber(self.source_line-1)
-            self.code_editor.setTextCursor(QTextCursor(block))
-            self.code_editor.moveCursor(QTextCursor.EndOfBlock)
+            with stage(self.profile, "cursor"):
+                block = self.code_editor.document().findBlockByLineNumber(
+                    self.source_line - self.code_editor.first_line_number())
+                self.code_editor.setTextCursor(QTextCursor(block))
+                self.code_editor.moveCursor(QTextCursor.EndOfBlock)
+        self.display_statistics()
+
+    def _watch(self, future, callback):
+        watcher = FutureWatcher(future, parent=self)
+        watcher.done.connect(callback)
+        watcher.done.connect(watcher.deleteLater)
+
+    # Read-ahead
+
+    def prefetch(self, dataset):
+        """
+        Read ahead, in the background, the files of the rows following the
+        first one of `dataset` and its most frequent files, so that walking
+        through the bugs does not wait for the disk or the network.
+        """
+        for future in self._prefetches:
+            future.cancel()
+        self._prefetches = []
+        location = self.location_columns(dataset.domain, dataset)
+        if location is None:
+            return
+        future = self._prefetcher.submit(prefetch_paths, dataset, *location,
+                                         rows=PREFETCH_ROWS, files=PREFETCH_FILES)
+        self._prefetches.append(future)
+        self._watch(future, self._prefetch_paths_found)
+
+    def _prefetch_paths_found(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        for source_file in future.result():
+            path = self.resolve_path(source_file)
+            if path in self.documents or path in self.texts:
+                continue
+            read = self._prefetcher.submit(read_source, path, large_size=self.large_file_mb * 1024 * 1024,
+                                           index_large=False)
+            self._prefetches.append(read)
+            self._watch(read, partial(self._prefetched, path))
+
+    def _prefetched(self, path, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        stamp, code = future.result()
+        if code is not None and path not in self.documents:
+            self.texts.put(path, stamp, code, len(code))
 
     def is_source_file(self,value):
         #print(value.__class__.__name__)
@@ -167,12 +585,24 @@ class OWCodeViewer(OWWidget):
         return False
 
     # Information display
+    def display_statistics(self):
+        if self.profile is None:
+            return
+        self.profile.info["file"] = self.source_file
+        self.profile.emit()
+        if self.show_statistics:
+            self.infoLabel.setText(self.infoLabel.text() + self.profile.describe())
+
     def display_no_source_selected(self):
         self.infoLabel.setText('No source file selected')
 
     def display_file_not_found(self):
         self.infoLabel.setText('Source file not found')
 
+    def display_loading(self):
+        filename = self.source_file.split("/")[-1].split("\\")[-1]
+        self.infoLabel.setText("Loading <b>{}</b>...".format(filename))
+
     def display_error(self,message):
         self.infoLabel.setText('An error has occured: '+message)
 
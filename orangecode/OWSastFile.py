@@ -1,11 +1,13 @@
 import sys
 import logging
+from functools import partial
 from warnings import catch_warnings
 
-import numpy as np
+import scipy.sparse as sp
 from Orange.widgets.utils.filedialogs import RecentPathsWComboMixin
 
 
+from AnyQt.QtCore import Qt
 from AnyQt.QtWidgets import (
     QTextEdit,QGridLayout,QSizePolicy,QStyle, QMessageBox, QFileDialog, QFileIconProvider, QComboBox
 )
@@ -17,6 +19,7 @@ from Orange.widgets import widget, gui
 from Orange.data import Table,Variable
 
 from Orange.widgets.utils.domaineditor import DomainEditor
+from Orange.widgets.utils.concurrent import ConcurrentWidgetMixin
 
 from Orange.widgets.settings import Setting, ContextSetting, \
     PerfectDomainContextHandler, SettingProvider
@@ -24,6 +27,14 @@ from Orange.widgets.settings import Setting, ContextSetting, \
 import os
 
 from orangecode.reader.SpotbugsReader import SpotbugsReader
+from orangecode.reader.ReportFormats import REPORT_READERS, reader_for
+from orangecode.reader.SpotbugsUtil import BugFilter
+from orangecode.reader.ReportCache import ReportCache
+from orangecode.reader.ReportFiles import report_exists, is_multi_report, join_report_paths, split_report_paths
+from orangecode.reader.ReportSummary import summarize
+from orangecode.reader.SourceLocation import has_split_source, with_location
+from orangecode.Instrumentation import LoadProfile, stage
+from orangecode.FingerprintContextHandler import FingerprintContextHandler
 
 
 log = logging.getLogger(__name__)
@@ -88,7 +99,33 @@ def open_filename_dialog(start_dir, start_filter, file_formats,
     file_format = file_formats[filters.index(filter)]
     return filename, file_format, filter
 
-class OWSastFile(OWWidget,RecentPathsWComboMixin):
+class LoadCancelled(Exception):
+    pass
+
+def run_reader(read, reader, summary_top, state):
+    """
+    Run `read` (a bound read method of `reader`) in a worker thread,
+    reporting progress to `state` and stopping when interruption is
+    requested. Returns the table, its summary (see ReportSummary.summarize,
+    with `summary_top` hotspots) and the warnings raised while reading.
+    """
+    def progress(value):
+        if state.is_interruption_requested():
+            raise LoadCancelled()
+        state.set_progress_value(value)
+
+    reader.progress = progress
+    with catch_warnings(record=True) as warnings:
+        if reader.profile is None:
+            data = read()
+        else:
+            with reader.profile.profiled():
+                data = read()
+        with stage(reader.profile, "summary", len(data)):
+            summary = summarize(data, summary_top)
+    return data, summary, [str(w.message) for w in warnings]
+
+class OWSastFile(OWWidget,RecentPathsWComboMixin,ConcurrentWidgetMixin):
     name = "Bugs File"
     id = "gosecure.widgets.data.sastfile"
     description = "Read bug report from various Static Analysis Scanning Tool (SAST)"
@@ -99,16 +136,38 @@ class OWSastFile(OWWidget,RecentPathsWComboMixin):
 
     class Outputs:
         data = Output("Data", Table, doc="Bugs")
+        summary = Output("Summary", Table,
+                         doc="Bug counts per file, class, category and type, rank histogram and hotspots")
 
 
     want_main_area = False
 
 
-    settingsHandler = PerfectDomainContextHandler(
+    settings_version = 2
+    settingsHandler = FingerprintContextHandler(
         match_values=PerfectDomainContextHandler.MATCH_VALUES_ALL
     )
 
     variables = ContextSetting([])
+    use_cache = Setting(True)
+    cache_size_mb = Setting(1024)
+    #Empty: the pattern of the report format (*.xml, *.sarif*, ...)
+    report_pattern = Setting("")
+    jobs = Setting(os.cpu_count() or 1)
+    show_statistics = Setting(False)
+    trace_memory = Setting(False)
+    auto_load_limit = Setting(500000)
+    min_rank = Setting(1)
+    max_rank = Setting(20)
+    priorities = Setting("")
+    categories = Setting("")
+    bug_types = Setting("")
+    prefixes = Setting("")
+    baseline_path = Setting("")
+    split_source = Setting(False)
+    location_column = Setting(False)
+    sparse_output = Setting(False)
+    summary_top = Setting(20)
     domain_editor = SettingProvider(DomainEditor)
 
     class Warning(widget.OWWidget.Warning):
@@ -122,9 +181,21 @@ class OWSastFile(OWWidget,RecentPathsWComboMixin):
         sheet_error = widget.Msg("Error listing available sheets.")
         unknown = widget.Msg("Read error:\n{}")
 
+    @classmethod
+    def migrate_settings(cls, settings, version):
+        #"*.xml" was the default pattern; an empty one uses that of the report format
+        if (version or 1) < 2 and settings.get("report_pattern") == "*.xml":
+            settings["report_pattern"] = ""
+
     def __init__(self):
         super().__init__()
         RecentPathsWComboMixin.__init__(self)
+        ConcurrentWidgetMixin.__init__(self)
+        self.data = None
+        self.loaded_file = None
+        self.profile = None
+        self._profile_path = None
+        self._summary_text = ""
 
         layout = QGridLayout()
         gui.widgetBox(self.controlArea, margin=0, orientation=layout)
@@ -133,6 +204,10 @@ class OWSastFile(OWWidget,RecentPathsWComboMixin):
         box.setSizePolicy(QSizePolicy.MinimumExpanding, QSizePolicy.Fixed)
         self.file_combo.setSizePolicy(QSizePolicy.MinimumExpanding, QSizePolicy.Fixed)
         self.file_combo.activated[int].connect(self.select_file)
+        #A folder, a glob or a list of reports separated by ';' can also be typed
+        self.file_combo.setEditable(True)
+        self.file_combo.setInsertPolicy(QComboBox.NoInsert)
+        self.file_combo.lineEdit().returnPressed.connect(self.enter_path)
         box.layout().addWidget(self.file_combo)
         layout.addWidget(box, 0, 1)
 
@@ -141,18 +216,81 @@ class OWSastFile(OWWidget,RecentPathsWComboMixin):
         file_button.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Fixed)
         layout.addWidget(file_button, 0, 2)
 
+        self.cancel_button = gui.button(
+            None, self, "Cancel", callback=self.cancel_load, autoDefault=False)
+        self.cancel_button.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        self.cancel_button.setEnabled(False)
+        layout.addWidget(self.cancel_button, 0, 5)
+
+        folder_button = gui.button(None, self, 'Folder...', callback=self.browse_folder, autoDefault=False)
+        folder_button.setSizePolicy(QSizePolicy.Maximum, QSizePolicy.Fixed)
+        layout.addWidget(folder_button, 0, 4)
 
         reload_button = gui.button(
-            None, self, "Reload", callback=self.load_data, autoDefault=False)
+            None, self, "Reload", callback=self.reload_data, autoDefault=False)
         reload_button.setIcon(self.style().standardIcon(
             QStyle.SP_BrowserReload))
         reload_button.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
         layout.addWidget(reload_button, 0, 3)
 
+        box = gui.hBox(None, addToLayout=False, margin=0)
+        gui.checkBox(box, self, "use_cache", "Cache parsed reports")
+        gui.spin(box, self, "cache_size_mb", 16, 1024 * 64, step=64,
+                 label="Size limit (MB):", callback=self._update_cache_limit)
+        gui.button(box, self, "Clear cache", callback=self.clear_cache, autoDefault=False)
+        layout.addWidget(box, 1, 1, 1, 5)
+
+        box = gui.hBox(None, addToLayout=False, margin=0)
+        pattern_edit = gui.lineEdit(box, self, "report_pattern", "Reports in folder:", orientation=Qt.Horizontal)
+        pattern_edit.setPlaceholderText("By format")
+        gui.spin(box, self, "jobs", 1, 256, label="Parallel jobs:")
+        limit_spin = gui.spin(box, self, "auto_load_limit", 0, 10 ** 9, step=10000,
+                              label="Auto-load up to (bugs):")
+        limit_spin.setSpecialValueText("No limit")
+        gui.spin(box, self, "summary_top", 1, 1000, label="Hotspots:")
+        gui.checkBox(box, self, "split_source", "Separate file and line",
+                     tooltip="Load the source location as a categorical file and a numeric line "
+                             "(much less memory for large reports)")
+        gui.checkBox(box, self, "location_column", "Location column", callback=self.apply_domain_edit,
+                     tooltip="With a separate file and line, also output the combined path:line "
+                             "as a Location meta")
+        gui.checkBox(box, self, "sparse_output", "Sparse one-hot classes and methods",
+                     tooltip="Output BugClass, BugMethod and SinkMethod as sparse indicator columns "
+                             "(for modelling; the original columns become metas)")
+        layout.addWidget(box, 2, 1, 1, 5)
+
+        box = gui.hBox(None, addToLayout=False, margin=0)
+        gui.checkBox(box, self, "show_statistics", "Show load statistics")
+        gui.checkBox(box, self, "trace_memory", "Trace memory")
+        gui.button(box, self, "Profile next load...", callback=self.profile_next_load, autoDefault=False)
+        layout.addWidget(box, 3, 1, 1, 5)
+
+        box = gui.hBox(None, addToLayout=False, margin=0)
+        gui.lineEdit(box, self, "baseline_path", "Compare with baseline:", orientation=Qt.Horizontal,
+                     tooltip="Earlier report; bugs are then marked as new, fixed or unchanged")
+        gui.button(box, self, "...", callback=self.browse_baseline, autoDefault=False)
+        gui.button(box, self, "Clear", callback=self.clear_baseline, autoDefault=False)
+        layout.addWidget(box, 4, 1, 1, 5)
+        self.report_cache = ReportCache(size_limit=self.cache_size_mb * 1024 * 1024)
+
         self.sheet_box = gui.hBox(None, addToLayout=False, margin=0)
 
+        box = gui.vBox(self.controlArea, "Filter (applied when loading)")
+        hbox = gui.hBox(box, margin=0)
+        gui.spin(hbox, self, "min_rank", 1, 20, label="Rank from:")
+        gui.spin(hbox, self, "max_rank", 1, 20, label="to:")
+        gui.lineEdit(hbox, self, "priorities", "Priorities:", orientation=Qt.Horizontal,
+                     tooltip="Comma separated priorities (1 = high, 2 = normal, 3 = low)")
+        gui.lineEdit(box, self, "categories", "Categories:", orientation=Qt.Horizontal,
+                     tooltip="Comma separated categories, e.g. SECURITY, MALICIOUS_CODE")
+        gui.lineEdit(box, self, "bug_types", "Bug types:", orientation=Qt.Horizontal,
+                     tooltip="Comma separated bug types, e.g. SQL_INJECTION_JDBC")
+        gui.lineEdit(box, self, "prefixes", "Class or path prefixes:", orientation=Qt.Horizontal,
+                     tooltip="Comma separated prefixes of the class names (com.example.) "
+                             "or source paths (com/example/)")
+
         box = gui.vBox(self.controlArea, "Info")
-        self.info = gui.widgetLabel(box, 'No data loaded.')
+        self.info_label = gui.widgetLabel(box, 'No data loaded.')
         self.warnings = gui.widgetLabel(box, '')
 
         #Domain editor
@@ -179,34 +317,194 @@ class OWSastFile(OWWidget,RecentPathsWComboMixin):
     def browse_file(self):
         start_file = self.last_path() or os.path.expanduser("~/")
 
-        #readers = [f for f in FileFormat.formats
-        #           if getattr(f, 'read', None) and getattr(f, "EXTENSIONS", None)]
-        readers = [SpotbugsReader]
-        print(readers)
-        filename, reader, _ = open_filename_dialog(start_file, None, readers)
+        #The format is recognized when loading, whatever the filter chosen; several
+        #reports are loaded as one table
+        filenames, reader, _ = open_filename_dialog(start_file, None, list(REPORT_READERS),
+                                                    dialog=QFileDialog.getOpenFileNames)
+        if not filenames:
+            return
+        self.add_path(join_report_paths(filenames))
+        self.load_data()
+
+    def enter_path(self):
+        """Load the report, folder, glob or list of reports typed in the file combo."""
+        text = self.file_combo.currentText().strip()
+        #Recent files are selected by select_file
+        if not text or self.file_combo.findText(text) >= 0:
+            return
+        self.add_path(os.path.expanduser(text))
+        self.load_data()
+
+    def browse_folder(self):
+        start_dir = self.last_path() or os.path.expanduser("~/")
+        directory = QFileDialog.getExistingDirectory(None, "Open reports folder...", start_dir)
+        if not directory:
+            return
+        self.add_path(directory)
+        self.load_data()
+
+    def browse_baseline(self):
+        start_file = self.baseline_path or self.last_path() or os.path.expanduser("~/")
+        filename, _, _ = open_filename_dialog(start_file, None, [SpotbugsReader], title="Open baseline...")
         if not filename:
             return
-        self.add_path(filename)
+        self.baseline_path = filename
         self.load_data()
 
-    def load_data(self):
+    def clear_baseline(self):
+        self.baseline_path = ""
+        self.load_data()
+
+    def load_data(self, force=False):
+        """
+        Load the current report. Unless `force` is set, a report whose summary
+        announces more than `auto_load_limit` bugs is only described; the user
+        loads it with Reload. A load in progress is cancelled first, whatever
+        becomes of this one.
+        """
+        self.cancel()
+        self.cancel_button.setEnabled(False)
         self.closeContext()
         self.domain_editor.set_domain(None)
         self.apply_button.setEnabled(False)
         self.clear_messages()
         self.set_file_list()
 
-        error = self._try_load()
+        error = self._try_load(force)
         if error:
             error()
             self.data = None
             self.sheet_box.hide()
             self.Outputs.data.send(None)
-            self.info.setText("No data.")
+            self.Outputs.summary.send(None)
+            self.info_label.setText("No data.")
+
+    def reload_data(self):
+        """
+        Reload the current report, reusing the rows of unchanged bugs when
+        the report was loaded before. Falls back to a full load otherwise.
+        """
+        path = self.last_path()
+        source = split_report_paths(path)
+        if self.data is None or path != self.loaded_file or is_multi_report(source) or not report_exists(source) \
+                or "BugId" not in self.data.domain or self.baseline_path \
+                or ("Line" in self.data.domain) != self.split_source \
+                or sp.issparse(self.data.X) != self.sparse_output:
+            self.load_data(force=True)
+            return
+
+        self.clear_messages()
+        self.reader = self._get_reader()
+        if not hasattr(self.reader, "read_incremental"):
+            self.load_data(force=True)
+            return
+        self._summary_text = self._describe_summary(self.reader.peek())
+        self._start_read(partial(self.reader.read_incremental, self.data), incremental=True)
+
+    def _apply_reload(self, data):
+        if data is self.data:
+            self.info_label.setText(self._describe(data) + "<p>Reload: no change.</p>" + self._finish_profile())
+            return
+        if data.domain is not self.data.domain:
+            self.closeContext()
+            self.domain_editor.set_domain(None)
+            add_origin(data, self.loaded_file)
+            self.data = data
+            with stage(self.profile, "context"):
+                self.openContext(data.domain)
+        else:
+            self.data = data
+        with stage(self.profile, "domain edit", len(data)):
+            self.apply_domain_edit()
+        self.info_label.setText(self._describe(data) +
+                          "<p>Reload: {} new, {} fixed bug(s).</p>".format(*self.reader.changes) +
+                          self._finish_profile())
+
+    def _start_read(self, read, incremental=False):
+        self._incremental = incremental
+        self.profile = LoadProfile(os.path.basename(str(self.last_path())),
+                                   trace_memory=self.trace_memory, profile_path=self._profile_path)
+        self.profile.info["mode"] = "incremental" if incremental else "full"
+        self._profile_path = None
+        self.reader.profile = self.profile
+        self.info_label.setText(self._summary_text + "Loading...")
+        self.cancel_button.setEnabled(True)
+        self.start(run_reader, read, self.reader, self.summary_top)
+
+    def _finish_profile(self):
+        """Log the measurements of the load; return them as HTML if they are shown."""
+        if self.profile is None:
+            return ""
+        self.profile.emit()
+        return self.profile.describe() if self.show_statistics else ""
+
+    def profile_next_load(self):
+        filename, _ = QFileDialog.getSaveFileName(
+            None, "Save profile of the next load", "load.prof", "cProfile statistics (*.prof)")
+        if filename:
+            self._profile_path = filename
+
+    def cancel_load(self):
+        self.cancel()
+        self.cancel_button.setEnabled(False)
+        self.info_label.setText("Loading cancelled.")
+
+    def on_done(self, result):
+        self.cancel_button.setEnabled(False)
+        data, summary, warnings = result
+        if warnings:
+            self.Warning.load_warning(warnings[-1])
+        self.Outputs.summary.send(summary)
+        if self._incremental:
+            self._apply_reload(data)
+        else:
+            self._set_data(data)
+
+    def on_exception(self, ex):
+        self.cancel_button.setEnabled(False)
+        if isinstance(ex, LoadCancelled):
+            return
+        log.error("Unable to read %s", self.last_path(), exc_info=ex)
+        self.Error.unknown(str(ex))
+        self.data = None
+        self.Outputs.data.send(None)
+        self.Outputs.summary.send(None)
+        self.info_label.setText("No data.")
+
+    def on_partial_result(self, result):
+        pass
+
+    def onDeleteWidget(self):
+        self.shutdown()
+        super().onDeleteWidget()
 
     def _get_reader(self):
         path = self.last_path()
-        return SpotbugsReader(path)
+        source = split_report_paths(path)
+        reader = reader_for(source, self.report_pattern or None)
+        if reader is None:
+            return None
+        #Reloading the same report reuses its variables (and context)
+        domain = self.data.domain if self.data is not None and path == self.loaded_file else None
+        return reader(source, cache=self.report_cache if self.use_cache else None,
+                      pattern=self.report_pattern or None, jobs=self.jobs,
+                      bug_filter=self._get_bug_filter(), baseline=self.baseline_path or None,
+                      split_source=self.split_source, sparse=self.sparse_output, domain=domain)
+
+    def _get_bug_filter(self):
+        def split(text):
+            return [value.strip() for value in text.split(",") if value.strip()]
+
+        return BugFilter(min_rank=self.min_rank if self.min_rank > 1 else None,
+                         max_rank=self.max_rank if self.max_rank < 20 else None,
+                         priorities=split(self.priorities), categories=split(self.categories),
+                         bug_types=split(self.bug_types), prefixes=split(self.prefixes))
+
+    def _update_cache_limit(self):
+        self.report_cache.size_limit = self.cache_size_mb * 1024 * 1024
+
+    def clear_cache(self):
+        self.report_cache.clear()
 
     def _update_sheet_combo(self):
         if len(self.reader.sheets) < 2:
@@ -219,12 +517,11 @@ class OWSastFile(OWWidget,RecentPathsWComboMixin):
         self._select_active_sheet()
         self.sheet_box.show()
 
-    def _try_load(self):
-        
-        if self.last_path() and not os.path.exists(self.last_path()):
-            return self.Error.file_not_found
+    def _try_load(self, force=False):
 
-        print(self.last_path())
+        source = split_report_paths(self.last_path())
+        if source and not is_multi_report(source) and not report_exists(source):
+            return self.Error.file_not_found
 
         try:
             self.reader = self._get_reader()
@@ -237,23 +534,48 @@ class OWSastFile(OWWidget,RecentPathsWComboMixin):
         except Exception:
             return self.Error.sheet_error
 
-        with catch_warnings(record=True) as warnings:
-            try:
-                data = self.reader.read()
-            except Exception as ex:
-                log.exception(ex)
-                return lambda x=ex: self.Error.unknown(str(x))
-            if warnings:
-                self.Warning.load_warning(warnings[-1].message.args[0])
+        summary = self.reader.peek()
+        self._summary_text = self._describe_summary(summary)
+        if not force and self.auto_load_limit and summary is not None \
+                and summary.get("total_bugs", 0) > self.auto_load_limit:
+            #nothing may replace the described report behind its back
+            self.cancel()
+            self.cancel_button.setEnabled(False)
+            self.data = None
+            self.loaded_file = None
+            self.Outputs.data.send(None)
+            self.Outputs.summary.send(None)
+            self.info_label.setText(self._summary_text)
+            self.Warning.file_too_big()
+            return
 
-        self.info.setText(self._describe(data))
+        self._start_read(self.reader.read)
 
+    def _set_data(self, data):
         self.loaded_file = self.last_path()
         add_origin(data, self.loaded_file)
         self.data = data
-        self.openContext(data.domain)
-        self.apply_domain_edit()  # sends data
-
+        with stage(self.profile, "context"):
+            self.openContext(data.domain)
+        with stage(self.profile, "domain edit", len(data)):
+            self.apply_domain_edit()  # sends data
+
+        text = self._describe(data)
+        if self.reader.baseline:
+            text += "<p>Since the baseline: {} new, {} fixed bug(s).</p>".format(*self.reader.changes)
+        self.info_label.setText(text + self._finish_profile())
+
+
+    def _describe_summary(self, summary):
+        """HTML description of a report summary (see SpotbugsReader.peek)."""
+        if summary is None or "total_bugs" not in summary:
+            return ""
+        text = "<p>"
+        if summary["project"]:
+            text += "Project <b>{}</b><br/>".format(summary["project"])
+        text += "{} bug(s) reported in {} class(es), {} package(s)".format(
+            summary["total_bugs"], summary["total_classes"], summary["num_packages"])
+        return text + "</p>"
 
     def _describe(self, table):
         domain = table.domain
@@ -287,26 +609,53 @@ class OWSastFile(OWWidget,RecentPathsWComboMixin):
                 table[0, 'Timestamp'], table[-1, 'Timestamp'])
         return text
 
-    def select_file(self):
-        pass
+    def select_file(self, n):
+        """Load the n-th recent file, moved to the front of the list."""
+        super().select_file(n)
+        self.load_data()
 
     def apply_domain_edit(self):
         if self.data is None:
             table = None
         else:
             domain, cols = self.domain_editor.get_domain(self.data.domain, self.data)
-            if not (domain.variables or domain.metas):
+            if domain is self.data.domain:
+                #Nothing edited: send the loaded table without copying it
+                table = self.data
+            elif not (domain.variables or domain.metas):
                 table = None
             else:
-                X, y, m = cols
-                table = Table.from_numpy(domain, X, y, m, self.data.W)
-                table.name = self.data.name
-                table.ids = np.array(self.data.ids)
-                table.attributes = getattr(self.data, 'attributes', {})
+                table = self._edited_table(domain, cols)
+            if table is not None and self.location_column and has_split_source(table.domain) \
+                    and "Location" not in table.domain:
+                table = with_location(table)
 
         self.Outputs.data.send(table)
         self.apply_button.setEnabled(False)
 
+    def _edited_table(self, domain, cols):
+        """
+        Table of the edited `domain` with the columns `cols` built by the
+        domain editor. The arrays (X, Y, metas) whose variables are unchanged
+        are shared with the loaded table, and so are the row ids.
+        """
+        data = self.data
+
+        def same(old, new):
+            return len(old) == len(new) and all(a is b for a, b in zip(old, new))
+
+        X, y, m = cols
+        if same(data.domain.attributes, domain.attributes):
+            X = data.X
+        if same(data.domain.class_vars, domain.class_vars):
+            y = data.Y
+        if same(data.domain.metas, domain.metas):
+            m = data.metas
+        table = Table.from_numpy(domain, X, y, m, data.W, ids=data.ids)
+        table.name = data.name
+        table.attributes = getattr(data, 'attributes', {})
+        return table
+
 
 #For quick testing
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+"""
+Bounded cache of the highlighted documents of the source files shown by the
+Code Viewer, validated against the size and modification time of the files.
+"""
+import os
+from collections import OrderedDict
+
+#Estimated memory of a document per character of text: UTF-16 text, block
+#layouts and highlighting formats
+BYTES_PER_CHAR = 8
+
+
+def file_stamp(path):
+    """(size, modification time) of a file; it changes when the file is written."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SourceDocumentCache:
+    """
+    Least recently used documents, keyed by path. An entry keeps the item
+    stored (a document and its highlighter), the stamp of the file it was
+    read from and its estimated size in bytes; the caller checks the stamp
+    and discards entries of files that changed. Entries are evicted past
+    `budget` bytes and handed to `release`, if given, when they leave the
+    cache.
+    """
+
+    def __init__(self, budget, release=None):
+        self.budget = budget
+        self.release = release
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        return path in self._entries
+
+    def size(self):
+        return self._size
+
+    def lookup(self, path):
+        """(stamp, item) cached for `path` whatever the current file, or None."""
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        self._entries.move_to_end(path)
+        return entry[:2]
+
+    def discard(self, path):
+        if path in self._entries:
+            self._remove(path)
+
+    def put(self, path, stamp, item, cost):
+        """Cache `item` for `path`; it is kept even if it alone exceeds the budget."""
+        if path in self._entries:
+            self._remove(path)
+        self._entries[path] = (stamp, item, cost)
+        self._size += cost
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits its budget."""
+        while self._size > self.budget and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        for path in list(self._entries):
+            self._remove(path)
+
+    def _remove(self, path):
+        _, item, cost = self._entries.pop(path)
+        self._size -= cost
+        if self.release is not None:
+            self.release(item)
@@ -0,0 +1,259 @@
+"""
+Index of the files under the source directories of the Code Viewer, used to
+find the files named by reports whatever their root: SpotBugs paths are
+relative to a source folder (com/example/Foo.java), other tools give paths
+relative to the repository or with Windows separators.
+"""
+import hashlib
+import json
+import logging
+import os
+
+from Orange.misc.environ import cache_dir
+
+log = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+
+def default_index_dir():
+    return os.path.join(cache_dir(), "orangecode", "sources")
+
+
+def split_roots(text):
+    """Source directories listed in `text`, separated by ';' (or the path separator)."""
+    return [root.strip() for root in text.replace(os.pathsep, ";").split(";") if root.strip()]
+
+
+def path_parts(path):
+    """Components of a reported path, whatever its separators."""
+    return [part for part in path.replace("\\", "/").split("/") if part not in ("", ".")]
+
+
+class SourceIndex:
+    """
+    Files under `roots`, listed directory by directory with the modification
+    time of each directory, and indexed by file name. A path is resolved to
+    the indexed file sharing the longest suffix of path components with it:
+    the files of that name are filtered by longer and longer suffixes, so
+    the cost is the depth of the path times a quickly shrinking list.
+    """
+
+    def __init__(self, roots):
+        self.roots = [os.path.normpath(os.path.abspath(root)) for root in roots]
+        #Directory -> [modification time, names of its files]
+        self.directories = {}
+        #File name -> paths of the files of that name
+        self.by_name = {}
+
+    def __len__(self):
+        return sum(len(files) for _, files in self.directories.values())
+
+    # Scanning
+
+    def build(self):
+        """List every directory under the roots."""
+        self.directories = {}
+        self.by_name = {}
+        listing = {}
+        for root in self.roots:
+            self._scan(root, listing)
+        self._add(listing)
+        return self
+
+    def refresh(self):
+        """
+        Bring an index loaded from disk up to date: only the directories whose
+        modification time changed are listed again. Returns the number of
+        directories listed.
+        """
+        changed = 0
+        for directory, (mtime, _) in list(self.directories.items()):
+            if directory not in self.directories:
+                continue
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                self._forget(directory)
+                continue
+            if current != mtime:
+                changed += self.refresh_directory(directory)
+        for root in self.roots:
+            if root not in self.directories and os.path.isdir(root):
+                listing = {}
+                self._scan(root, listing)
+                self._add(listing)
+                changed += len(listing)
+        return changed
+
+    def refresh_directory(self, directory):
+        """
+        List `directory` again (after a change reported by a file system
+        watcher): its files are updated, new subdirectories are scanned and
+        removed ones forgotten. Returns the number of directories listed.
+        """
+        return self.apply_listing(*self.list_directory(directory))
+
+    def list_directory(self, directory):
+        """
+        First half of refresh_directory, which does not modify the index so
+        it can run in a worker thread: list `directory` and scan its
+        subdirectories the index does not know. Returns (directory, listing,
+        subdirectories) for apply_listing; listing maps the directories
+        listed to [modification time, files], None if `directory` is gone.
+        """
+        directory = os.path.normpath(directory)
+        try:
+            entry, subdirectories = self._list(directory)
+        except OSError:
+            return directory, None, []
+        listing = {directory: entry}
+        for subdirectory in subdirectories:
+            if subdirectory not in self.directories:
+                self._scan(subdirectory, listing)
+        return directory, listing, subdirectories
+
+    def apply_listing(self, directory, listing, subdirectories):
+        """Update the index with the result of list_directory; returns the number of directories listed."""
+        if listing is None:
+            self._forget(directory)
+            return 0
+        known = set(self.subdirectories(directory))
+        for path in listing:
+            self._remove_files(path)
+        self._add(listing)
+        for subdirectory in known.difference(subdirectories):
+            self._forget(subdirectory)
+        return len(listing)
+
+    def subdirectories(self, directory):
+        prefix = directory + os.sep
+        return [path for path in self.directories
+                if path.startswith(prefix) and os.sep not in path[len(prefix):]]
+
+    def _scan(self, top, listing):
+        """Add the directories under `top` to `listing` (see _list)."""
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            try:
+                entry, subdirectories = self._list(directory)
+            except OSError as ex:
+                log.warning("Unable to list %s: %s", directory, ex)
+                continue
+            listing[directory] = entry
+            stack.extend(subdirectories)
+
+    @staticmethod
+    def _list(directory):
+        """([modification time, files] of `directory`, its subdirectories); hidden entries are skipped."""
+        files = []
+        subdirectories = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                elif entry.is_file():
+                    files.append(entry.name)
+        return [os.stat(directory).st_mtime_ns, files], subdirectories
+
+    def _add(self, listing):
+        """Index the files of the directories of `listing`."""
+        self.directories.update(listing)
+        for directory, (_, files) in listing.items():
+            for name in files:
+                self.by_name.setdefault(name, []).append(os.path.join(directory, name))
+
+    def _remove_files(self, directory):
+        _, files = self.directories.pop(directory, (None, []))
+        for name in files:
+            paths = self.by_name.get(name, [])
+            path = os.path.join(directory, name)
+            if path in paths:
+                paths.remove(path)
+            if not paths:
+                self.by_name.pop(name, None)
+
+    def _forget(self, directory):
+        """Remove `directory` and everything under it."""
+        prefix = directory + os.sep
+        for path in [path for path in self.directories if path == directory or path.startswith(prefix)]:
+            self._remove_files(path)
+
+    # Resolution
+
+    def resolve(self, path):
+        """
+        The indexed file best matching the reported `path`, or None. Unless
+        `path` is a bare file name, the file must also match at least the
+        directory holding it.
+        """
+        parts = path_parts(path)
+        if not parts:
+            return None
+        candidates = self.by_name.get(parts[-1])
+        if not candidates:
+            return None
+        #Keep the files ending with ever longer suffixes of the path
+        suffix = os.sep + parts[-1]
+        for depth, part in enumerate(reversed(parts[:-1])):
+            suffix = os.sep + part + suffix
+            matching = [candidate for candidate in candidates if candidate.endswith(suffix)]
+            if not matching:
+                if not depth:
+                    return None
+                break
+            candidates = matching
+            if len(candidates) == 1:
+                break
+        #Ties go to the shortest path (the file closest to a root)
+        return min(candidates, key=len)
+
+    # Persistence
+
+    def index_path(self, directory=None):
+        key = hashlib.blake2b("\n".join(self.roots).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(directory or default_index_dir(), key + ".json")
+
+    def save(self, directory=None):
+        path = self.index_path(directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": INDEX_VERSION, "roots": self.roots, "directories": self.directories}, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, roots, directory=None):
+        """The index of `roots` saved by `save`, or None if there is none."""
+        index = cls(roots)
+        try:
+            with open(index.index_path(directory)) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if saved.get("version") != INDEX_VERSION or saved.get("roots") != index.roots:
+            return None
+        index._add(saved["directories"])
+        return index
+
+
+def open_index(roots, directory=None):
+    """
+    Index of `roots`: the saved one brought up to date, or a new one. The
+    index is saved when it changed. Run in a worker thread.
+    """
+    index = SourceIndex.load(roots, directory)
+    if index is None:
+        index = SourceIndex(roots).build()
+        changed = True
+    else:
+        changed = index.refresh() > 0
+    if changed:
+        try:
+            index.save(directory)
+        except OSError as ex:
+            log.warning("Unable to save the source index: %s", ex)
+    return index
@@ -0,0 +1,11 @@
+from orangecode.reader.CheckstyleUtil import parse_checkstyle_report, sniff_checkstyle
+from orangecode.reader.ReportReader import ReportReader
+
+class CheckstyleReader(ReportReader):
+    """Reader for Checkstyle XML reports"""
+
+    EXTENSIONS = ('.xml', '.xml.gz', '.xml.bz2', '.xml.xz')
+    DESCRIPTION = 'Checkstyle XML report'
+    PATTERN = "*.xml"
+    PARSE = staticmethod(parse_checkstyle_report)
+    SNIFF = staticmethod(sniff_checkstyle)
@@ -0,0 +1,26 @@
+"""
+Streaming parser of Checkstyle XML reports.
+"""
+from orangecode.reader.Schema import bug_row
+from orangecode.reader.ReportFiles import sniff
+from orangecode.reader.XmlUtil import iter_xml_children
+
+#Checkstyle severities mapped to the SpotBugs priorities (1 = high)
+SEVERITY_PRIORITIES = {"error": "1", "warning": "2", "info": "3", "ignore": "3"}
+
+def sniff_checkstyle(head):
+    """True if `head`, the start of a file, is the start of a Checkstyle report."""
+    return b"<checkstyle" in head
+
+def is_checkstyle_report(filename, sniff_size=4096):
+    return sniff_checkstyle(sniff(filename, sniff_size))
+
+def parse_checkstyle_report(filename, callback, progress=None):
+    """Parse a Checkstyle report and call `callback` with one row per error."""
+    for file, error in iter_xml_children(filename, "file", "error", progress):
+        #source is the check class, e.g. com.puppycrawl.tools.checkstyle.checks.naming.MemberNameCheck
+        source = error.get("source", "").split(".")
+        check = source[-1]
+        category = source[-2] if len(source) > 2 else ""
+        callback(bug_row(file.get("name", ""), error.get("line", ""), "", "", check,
+                         SEVERITY_PRIORITIES.get(error.get("severity"), ""), "", category))
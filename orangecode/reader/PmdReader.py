@@ -0,0 +1,11 @@
+from orangecode.reader.PmdUtil import parse_pmd_report, sniff_pmd
+from orangecode.reader.ReportReader import ReportReader
+
+class PmdReader(ReportReader):
+    """Reader for PMD XML reports"""
+
+    EXTENSIONS = ('.xml', '.xml.gz', '.xml.bz2', '.xml.xz')
+    DESCRIPTION = 'PMD XML report'
+    PATTERN = "*.xml"
+    PARSE = staticmethod(parse_pmd_report)
+    SNIFF = staticmethod(sniff_pmd)
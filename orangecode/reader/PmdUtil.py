@@ -0,0 +1,24 @@
+"""
+Streaming parser of PMD XML reports.
+"""
+from orangecode.reader.Schema import bug_row
+from orangecode.reader.ReportFiles import sniff
+from orangecode.reader.XmlUtil import iter_xml_children
+
+def sniff_pmd(head):
+    """True if `head`, the start of a file, is the start of a PMD report."""
+    return b"<pmd" in head
+
+def is_pmd_report(filename, sniff_size=4096):
+    return sniff_pmd(sniff(filename, sniff_size))
+
+def parse_pmd_report(filename, callback, progress=None):
+    """Parse a PMD report and call `callback` with one row per violation."""
+    for file, violation in iter_xml_children(filename, "file", "violation", progress):
+        get = violation.get
+        package = get("package", "")
+        bug_class = get("class", "")
+        if package and bug_class:
+            bug_class = package + "." + bug_class
+        callback(bug_row(file.get("name", ""), get("beginline", ""), bug_class, get("method", ""),
+                         get("rule", ""), get("priority", ""), "", get("ruleset", "")))
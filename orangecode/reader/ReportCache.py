@@ -0,0 +1,244 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from Orange.data import Table, Domain, ContinuousVariable, DiscreteVariable, StringVariable
+from Orange.misc.environ import cache_dir
+
+from orangecode.reader.Schema import DISCRETE, CONTINUOUS, STRING, ATTRIBUTE, CLASS, META
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+DEFAULT_SIZE_LIMIT = 1024 * 1024 * 1024
+
+_ARRAYS = ("X", "Y", "metas")
+
+
+def default_cache_dir():
+    return os.path.join(cache_dir(), "orangecode", "reports")
+
+
+def content_hash(filename, block_size=1024 * 1024):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def describe_variable(var, role):
+    """Return a JSON serializable description of a variable."""
+    if var.is_discrete:
+        return {"name": var.name, "kind": DISCRETE, "role": role, "values": list(var.values)}
+    if var.is_continuous:
+        return {"name": var.name, "kind": CONTINUOUS, "role": role, "sparse": var.sparse}
+    return {"name": var.name, "kind": STRING, "role": role}
+
+
+def describe_domain(domain):
+    """Return a JSON serializable description of a domain."""
+    return [describe_variable(var, ATTRIBUTE) for var in domain.attributes] + \
+           [describe_variable(var, CLASS) for var in domain.class_vars] + \
+           [describe_variable(var, META) for var in domain.metas]
+
+
+def domain_from_description(description, domain=None):
+    """
+    Domain described by `description`. The variables of `domain` matching
+    their description are reused, and so is `domain` if they all match.
+    """
+    reusable = {}
+    if domain is not None:
+        for role, variables in ((ATTRIBUTE, domain.attributes), (CLASS, domain.class_vars),
+                                (META, domain.metas)):
+            reusable.update((var.name, (var, describe_variable(var, role))) for var in variables)
+
+    places = {ATTRIBUTE: [], CLASS: [], META: []}
+    for column in description:
+        var, known = reusable.get(column["name"], (None, None))
+        if known != column:
+            var = _new_variable(column)
+        places[column["role"]].append(var)
+
+    def same(old, new):
+        return len(old) == len(new) and all(a is b for a, b in zip(old, new))
+
+    if domain is not None and same(domain.attributes, places[ATTRIBUTE]) and \
+            same(domain.class_vars, places[CLASS]) and same(domain.metas, places[META]):
+        return domain
+    return Domain(places[ATTRIBUTE], places[CLASS], places[META])
+
+
+def _new_variable(column):
+    if column["kind"] == DISCRETE:
+        return DiscreteVariable(column["name"], values=column["values"])
+    if column["kind"] == CONTINUOUS:
+        return ContinuousVariable(column["name"], sparse=column.get("sparse", False))
+    return StringVariable(column["name"])
+
+
+class ReportCache:
+    """
+    Persistent cache of parsed reports.
+
+    Every entry is a directory holding the table arrays as `.npy` files (so
+    numeric arrays can be memory-mapped on load) and the domain as JSON.
+    Entries are identified by the content hash of the report and a variant
+    string describing the reader options. An index maps (path, size, mtime)
+    to the content hash, so a warm hit does not need to read the report.
+    The least recently used entries are evicted past `size_limit` bytes.
+    """
+
+    INDEX = "index.json"
+
+    def __init__(self, directory=None, size_limit=DEFAULT_SIZE_LIMIT):
+        self.directory = directory or default_cache_dir()
+        self.size_limit = size_limit
+
+    # Index
+
+    def _index_path(self):
+        return os.path.join(self.directory, self.INDEX)
+
+    def _read_index(self):
+        try:
+            with open(self._index_path()) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {"version": CACHE_VERSION, "paths": {}, "entries": {}}
+        if index.get("version") != CACHE_VERSION:
+            self.clear()
+            return {"version": CACHE_VERSION, "paths": {}, "entries": {}}
+        return index
+
+    def _write_index(self, index):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._index_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp, self._index_path())
+
+    @staticmethod
+    def _path_key(filename):
+        stat = os.stat(filename)
+        return "{}|{}|{}".format(os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def _entry_key(digest, variant):
+        return "{}-{}".format(digest, hashlib.blake2b(variant.encode("utf-8"), digest_size=8).hexdigest())
+
+    def _content_hash(self, filename, index):
+        path_key = self._path_key(filename)
+        digest = index["paths"].get(path_key)
+        if digest is None:
+            digest = content_hash(filename)
+            index["paths"][path_key] = digest
+        return digest
+
+    # Entries
+
+    def load(self, filename, variant="", domain=None):
+        """
+        Return the cached table for `filename`, or None on a miss. The
+        variables of `domain` are reused where they match (see
+        domain_from_description).
+        """
+        index = self._read_index()
+        try:
+            key = self._entry_key(self._content_hash(filename, index), variant)
+        except OSError:
+            return None
+        if key not in index["entries"]:
+            self._write_index(index)
+            return None
+
+        entry_dir = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry_dir, "domain.json")) as f:
+                domain = domain_from_description(json.load(f), domain)
+            # Copy-on-write mapping: pages are read lazily and the table stays writable
+            X, Y, metas = (self._load_array(entry_dir, name) for name in _ARRAYS)
+        except (OSError, ValueError, KeyError):
+            log.warning("Dropping unreadable cache entry %s", key)
+            self._remove_entry(index, key)
+            self._write_index(index)
+            return None
+
+        index["entries"][key]["last_used"] = time.time()
+        self._write_index(index)
+        metas = metas.astype(object)
+        #Metas are stored as strings; discrete and numeric ones hold codes
+        for i, var in enumerate(domain.metas):
+            if not var.is_string:
+                metas[:, i] = metas[:, i].astype(float)
+        return Table.from_numpy(domain, X, Y, metas)
+
+    def store(self, filename, table, variant=""):
+        """
+        Cache `table` read from `filename`. The entry is written to a
+        temporary directory renamed into place once complete, so a failed
+        store leaves no partial entry.
+        """
+        index = self._read_index()
+        key = self._entry_key(self._content_hash(filename, index), variant)
+        entry_dir = os.path.join(self.directory, key)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=key + ".", suffix=".tmp", dir=self.directory)
+        try:
+            self._write_entry(tmp_dir, table)
+            size = sum(entry.stat().st_size for entry in os.scandir(tmp_dir))
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        index["entries"][key] = {"size": size, "last_used": time.time()}
+        self._evict(index)
+        self._write_index(index)
+
+    @staticmethod
+    def _write_entry(entry_dir, table):
+        with open(os.path.join(entry_dir, "domain.json"), "w") as f:
+            json.dump(describe_domain(table.domain), f)
+        if sp.issparse(table.X):
+            sp.save_npz(os.path.join(entry_dir, "X.npz"), sp.csr_matrix(table.X), compressed=False)
+        else:
+            np.save(os.path.join(entry_dir, "X.npy"), np.ascontiguousarray(table.X, dtype=float))
+        Y = np.ascontiguousarray(table.Y, dtype=float).reshape(len(table), len(table.domain.class_vars))
+        np.save(os.path.join(entry_dir, "Y.npy"), Y)
+        np.save(os.path.join(entry_dir, "metas.npy"), table.metas.astype(str))
+
+    @staticmethod
+    def _load_array(entry_dir, name):
+        """Load an array of an entry; a sparse X is stored as a `.npz` matrix."""
+        path = os.path.join(entry_dir, name + ".npz")
+        if name == "X" and os.path.exists(path):
+            return sp.load_npz(path)
+        return np.load(os.path.join(entry_dir, name + ".npy"), mmap_mode=None if name == "metas" else "c")
+
+    def _remove_entry(self, index, key):
+        index["entries"].pop(key, None)
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+
+    def _evict(self, index):
+        entries = index["entries"]
+        total = sum(entry["size"] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["last_used"]):
+            if total <= self.size_limit:
+                break
+            total -= entries[key]["size"]
+            self._remove_entry(index, key)
+
+        live = {key.split("-")[0] for key in entries}
+        index["paths"] = {path: digest for path, digest in index["paths"].items() if digest in live}
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
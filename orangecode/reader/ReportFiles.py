@@ -0,0 +1,204 @@
+"""
+Locating and opening report files: plain, compressed (gzip, bz2, xz) or
+stored in zip archives. A report inside an archive is designated by the
+archive path followed by the member name, e.g. ``bundle.zip/module/spotbugs.xml``.
+"""
+import bz2
+import fnmatch
+import glob
+import gzip
+import lzma
+import os
+import zipfile
+
+DECOMPRESSORS = {
+    ".gz": gzip.open,
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+}
+
+ARCHIVE_EXTENSIONS = (".zip",)
+
+#Separates the reports of a list kept as a single path (see join_report_paths)
+REPORT_LIST_SEPARATOR = ";"
+
+
+def strip_compression(name):
+    """Name without its compression extension (report.xml.gz -> report.xml)."""
+    base, extension = os.path.splitext(name)
+    return base if extension.lower() in DECOMPRESSORS else name
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+def split_archive_member(path):
+    """Return (archive, member) for a path inside a zip archive, else (None, None)."""
+    normalized = path.replace("\\", "/")
+    lower = normalized.lower()
+    for extension in ARCHIVE_EXTENSIONS:
+        start = 0
+        while True:
+            i = lower.find(extension + "/", start)
+            if i < 0:
+                break
+            archive = normalized[:i + len(extension)]
+            if os.path.isfile(archive):
+                return archive, normalized[i + len(extension) + 1:]
+            start = i + 1
+    return None, None
+
+
+def report_exists(path):
+    archive, member = split_archive_member(path)
+    if archive is None:
+        return os.path.exists(path)
+    with zipfile.ZipFile(archive) as zf:
+        return member in zf.NameToInfo
+
+
+def report_size(path):
+    """Bytes read from disk to parse the report (compressed size)."""
+    archive, member = split_archive_member(path)
+    if archive is None:
+        return os.path.getsize(path)
+    with zipfile.ZipFile(archive) as zf:
+        return zf.getinfo(member).compress_size
+
+
+class ProgressFile:
+    """Binary stream wrapper reporting the percentage of `size` bytes read."""
+
+    def __init__(self, stream, size, progress):
+        self._stream = stream
+        self._size = size or 1
+        self._read = 0
+        self._progress = progress
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self._read += len(data)
+        self._progress(min(100, 100 * self._read / self._size))
+        return data
+
+    def close(self):
+        self._stream.close()
+
+
+class ReportStream:
+    """Readable binary stream that closes the whole chain of wrapped streams."""
+
+    def __init__(self, stream, *underlying):
+        self._stream = stream
+        self._underlying = underlying
+        self.read = stream.read
+
+    def close(self):
+        self._stream.close()
+        for stream in self._underlying:
+            stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_report(path, progress=None):
+    """
+    Open a report for reading as a binary stream, decompressing on the fly.
+    `progress` is called with the percentage of the file (or archive member)
+    read so far.
+    """
+    archive, member = split_archive_member(path)
+    if archive is not None:
+        with zipfile.ZipFile(archive) as zf:
+            info = zf.getinfo(member)
+            # The member keeps the archive file open after the ZipFile is closed
+            raw = zf.open(info)
+        size, name = info.file_size, member
+    else:
+        raw = open(path, "rb")
+        size, name = os.fstat(raw.fileno()).st_size, path
+
+    if progress is not None:
+        raw = ProgressFile(raw, size, progress)
+
+    decompressor = DECOMPRESSORS.get(os.path.splitext(name)[1].lower())
+    if decompressor is None:
+        return ReportStream(raw)
+    return ReportStream(decompressor(raw, "rb"), raw)
+
+
+def sniff(path, size=4096):
+    """First `size` decompressed bytes of a report (empty if unreadable)."""
+    try:
+        with open_report(path) as stream:
+            return stream.read(size)
+    except (OSError, EOFError, KeyError, zipfile.BadZipFile, lzma.LZMAError):
+        return b""
+
+
+def archive_members(archive, pattern="*", accept=None):
+    with zipfile.ZipFile(archive) as zf:
+        names = [info.filename for info in zf.infolist() if not info.is_dir()]
+    paths = [archive + "/" + name for name in sorted(names)
+             if fnmatch.fnmatch(strip_compression(os.path.basename(name)), pattern)]
+    return [path for path in paths if accept is None or accept(path)]
+
+
+def join_report_paths(paths):
+    """Single path designating the reports `paths` (see split_report_paths)."""
+    return REPORT_LIST_SEPARATOR.join(paths)
+
+
+def split_report_paths(source):
+    """The list of reports joined in `source` by join_report_paths, or `source` itself."""
+    if not isinstance(source, str) or REPORT_LIST_SEPARATOR not in source:
+        return source
+    paths = [path.strip() for path in source.split(REPORT_LIST_SEPARATOR) if path.strip()]
+    return paths if len(paths) > 1 else "".join(paths)
+
+
+def is_multi_report(source):
+    """True if `source` designates several reports (list, directory, glob or archive)."""
+    return isinstance(source, (list, tuple)) or os.path.isdir(source) or \
+        glob.has_magic(source) or is_archive(source)
+
+
+def expand_report_paths(source, pattern="*.xml", accept=None):
+    """
+    Return the report files designated by `source`: a file, a directory
+    (searched recursively for reports matching `pattern`, compressed or
+    inside zip archives), a glob, a zip archive or a list of any of these.
+    `accept` filters the files found when searching directories and archives.
+    """
+    if isinstance(source, (list, tuple)):
+        return [path for item in source for path in expand_report_paths(item, pattern, accept)]
+    if os.path.isdir(source):
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                if name.lower().endswith(ARCHIVE_EXTENSIONS):
+                    paths.extend(archive_members(path, pattern, accept))
+                elif fnmatch.fnmatch(strip_compression(name), pattern) and (accept is None or accept(path)):
+                    paths.append(path)
+        return paths
+    if glob.has_magic(source):
+        return [path for match in sorted(glob.glob(source, recursive=True))
+                for path in (archive_members(match, pattern, accept) if is_archive(match) else [match])]
+    if is_archive(source):
+        return archive_members(source, pattern, accept)
+    return [source]
+
+
+def report_labels(paths):
+    """Short names for a list of reports, relative to their common directory."""
+    if len(paths) < 2:
+        return [os.path.basename(path) for path in paths]
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return [os.path.relpath(os.path.abspath(path), root) for path in paths]
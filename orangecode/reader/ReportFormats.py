@@ -0,0 +1,41 @@
+"""
+Registry of the report readers. The format of a report is recognized from
+its first bytes, so no reader has to attempt a full parse.
+"""
+from orangecode.reader.SpotbugsReader import SpotbugsReader
+from orangecode.reader.SarifReader import SarifReader
+from orangecode.reader.PmdReader import PmdReader
+from orangecode.reader.CheckstyleReader import CheckstyleReader
+from orangecode.reader.ReportFiles import sniff, is_multi_report, expand_report_paths
+
+REPORT_READERS = [SpotbugsReader, SarifReader, PmdReader, CheckstyleReader]
+
+SNIFF_SIZE = 4096
+
+def sniff_reader(filename, sniff_size=SNIFF_SIZE):
+    """Reader class of a single report, or None if its format is unknown."""
+    head = sniff(filename, sniff_size)
+    for reader in REPORT_READERS:
+        if reader.sniff(head):
+            return reader
+    return None
+
+def is_known_report(filename):
+    return sniff_reader(filename) is not None
+
+def reader_for(source, pattern=None):
+    """
+    Reader class for `source`, a report or several reports (see
+    ReportFiles.expand_report_paths), from the format of the first report
+    found; None if there is none. Directories are searched with `pattern`,
+    or else with the PATTERN of each reader in turn.
+    """
+    if not is_multi_report(source):
+        return sniff_reader(source)
+    patterns = [pattern] if pattern else list(dict.fromkeys(reader.PATTERN for reader in REPORT_READERS))
+    for pattern in patterns:
+        for path in expand_report_paths(source, pattern):
+            reader = sniff_reader(path)
+            if reader is not None:
+                return reader
+    return None
@@ -0,0 +1,241 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from Orange.data.io import FileFormat
+
+from orangecode.reader.Schema import REPORT_FILE_COLUMN, SPARSE_COLUMNS, bug_columns, split_source_row
+from orangecode.reader.SpotbugsUtil import BugFilter
+from orangecode.reader.ReportFiles import is_multi_report, expand_report_paths, report_labels, report_size, \
+    sniff
+from orangecode.reader.TableBuilder import ColumnarTableBuilder
+from orangecode.Instrumentation import stage
+
+log = logging.getLogger(__name__)
+
+#Modules imported once by the fork server of the parsing workers (see worker_context)
+WORKER_PRELOAD = ["orangecode.reader.ReportFormats"]
+
+def row_appender(builder, split_source=False, suffix=None):
+    """
+    Function adding a row of BUG_COLUMNS, followed by the `suffix` values,
+    to `builder`, whose columns are `bug_columns(split_source)` + suffix.
+    """
+    append = builder.append
+    if split_source and suffix:
+        return lambda row: append(split_source_row(row) + suffix)
+    if split_source:
+        return lambda row: append(split_source_row(row))
+    if suffix:
+        return lambda row: append(row + suffix)
+    return append
+
+def report_builder(report_label=None, split_source=False, domain=None):
+    """Builder and row appender for the rows of one report (see row_appender)."""
+    columns = bug_columns(split_source)
+    if report_label is not None:
+        columns.append(REPORT_FILE_COLUMN)
+    builder = ColumnarTableBuilder(columns, domain=domain)
+    suffix = None if report_label is None else [report_label]
+    return builder, row_appender(builder, split_source, suffix)
+
+def parse_rows_columns(parse, filename, report_label=None, progress=None, bug_filter=None, split_source=False):
+    """
+    Parse one report with `parse(filename, callback, progress=...)`, a
+    function producing rows of BUG_COLUMNS, into a ColumnarTableBuilder.
+    When `report_label` is given, it is added to every row as the ReportFile
+    column. Rows rejected by the optional BugFilter are dropped. With
+    `split_source`, SourceFile is split into SourceFile and Line.
+    Module level so it can run in a worker process.
+    """
+    builder, append = report_builder(report_label, split_source)
+    if bug_filter:
+        parse(filename, lambda row: bug_filter.rejects_row(row) or append(row), progress=progress)
+    else:
+        parse(filename, append, progress=progress)
+    return builder
+
+def worker_context():
+    """
+    Multiprocessing context of the report parsing workers. Workers are not
+    forked from the caller: reports are parsed from a worker thread of a
+    multi-threaded (Qt) process, whose locks a forked child could inherit
+    held. A fork server, started once with the readers imported, makes new
+    workers cheap where it is available; they are spawned elsewhere.
+    """
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(WORKER_PRELOAD)
+    return context
+
+def merge_reports_columns(parse, paths, labels, jobs=None, progress=None):
+    """
+    Parse several reports with `parse(path, label)` in a process pool of
+    `jobs` workers (all cores by default) and merge the builders into one,
+    in the order of `paths`. `progress` is called with the percentage of
+    bytes parsed as reports complete; it may raise to abort, which cancels
+    the pending reports.
+    """
+    sizes = [report_size(path) for path in paths]
+    total = sum(sizes) or 1
+
+    def merge(builders):
+        merged = None
+        done = 0
+        for builder, size in zip(builders, sizes):
+            if merged is None:
+                merged = builder
+            else:
+                merged.extend(builder)
+            done += size
+            if progress is not None:
+                progress(100 * done / total)
+        return merged
+
+    jobs = min(jobs or os.cpu_count() or 1, len(paths))
+    if jobs <= 1:
+        return merge(map(parse, paths, labels))
+    executor = ProcessPoolExecutor(max_workers=jobs, mp_context=worker_context())
+    try:
+        return merge(executor.map(parse, paths, labels))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+class ReportReader(FileFormat):
+    """
+    Base of the readers of static analysis reports. Every reader produces a
+    table of BUG_COLUMNS (see Schema.bug_columns); subclasses set PARSE, a
+    module level function `parse(filename, callback, progress=None)` calling
+    `callback` with each row, and SNIFF, a function telling from the first
+    bytes of a file whether it is a report of their format.
+    """
+
+    SUPPORT_SPARSE_DATA = True
+    #Report files searched in directories by default
+    PATTERN = "*"
+    PARSE = None
+    SNIFF = None
+
+    def __init__(self, filename, cache=None, pattern=None, jobs=None, bug_filter=None, baseline=None,
+                 split_source=False, sparse=False, domain=None):
+        """
+        `filename` may be compressed (gzip, bz2, xz) or designate a report
+        inside a zip archive. It may also be a directory, a glob, a zip
+        archive or a list of reports, in which case they are parsed in
+        parallel by `jobs` worker processes and merged with a ReportFile
+        column. `pattern` selects the report files when searching a directory.
+        `bug_filter` (a SpotbugsUtil.BugFilter) selects the bugs to load.
+        A `baseline` report to compare with is only supported by some readers.
+        With `split_source`, the `path:line` SourceFile strings are replaced
+        by a categorical SourceFile and a numeric Line column (see
+        SourceLocation for the combined string). With `sparse`, the
+        high-cardinality SPARSE_COLUMNS are one-hot encoded in a sparse X.
+        The variables of `domain`, usually that of the table previously read
+        from the same report, are reused and extended with new values, and
+        the domain itself is kept when nothing changed.
+        """
+        super().__init__(filename)
+        self.bug_filter = bug_filter or BugFilter()
+        self.baseline = baseline
+        self.split_source = split_source
+        self.sparse = sparse
+        self.domain = domain
+        #Optional ReportCache consulted before parsing
+        self.cache = cache
+        self.pattern = pattern or self.PATTERN
+        self.jobs = jobs
+        #(added, removed) bug counts of the last incremental read or baseline comparison
+        self.changes = None
+        #Optional callable receiving the load progress (0-100); may raise to abort
+        self.progress = None
+        #Optional Instrumentation.LoadProfile recording the stages of a read
+        self.profile = None
+
+    @classmethod
+    def sniff(cls, head):
+        """True if `head`, the start of a file, is a report this reader reads."""
+        return cls.SNIFF(head)
+
+    @classmethod
+    def is_report(cls, filename, sniff_size=4096):
+        return cls.sniff(sniff(filename, sniff_size))
+
+    def cache_variant(self):
+        """Describe the options that change the table built from a report."""
+        variant = "{}:{}".format(type(self).__name__, ",".join(name for name, _, _ in self.columns()))
+        if self.sparse:
+            variant += ":sparse"
+        if self.bug_filter:
+            variant += ":" + self.bug_filter.describe()
+        return variant
+
+    def columns(self):
+        """Columns of the rows of one report."""
+        return bug_columns(self.split_source)
+
+    def sparse_columns(self):
+        """Columns one-hot encoded in the table (see ColumnarTableBuilder.to_table)."""
+        return SPARSE_COLUMNS if self.sparse else ()
+
+    def peek(self):
+        """Summary of the report read without parsing it, if the format has one."""
+        return None
+
+    def read(self):
+        if is_multi_report(self.filename) or self.baseline:
+            return self.parse()
+
+        if self.cache is not None:
+            with stage(self.profile, "cache lookup") as record:
+                table = self.cache.load(self.filename, self.cache_variant(), self.domain)
+                record["rows"] = None if table is None else len(table)
+            if table is not None:
+                return table
+
+        table = self.parse()
+
+        if self.cache is not None:
+            with stage(self.profile, "cache store"):
+                try:
+                    self.cache.store(self.filename, table, self.cache_variant())
+                except (OSError, ValueError) as ex:
+                    log.warning("Unable to cache %s: %s", self.filename, ex)
+        return table
+
+    def parse(self):
+        with stage(self.profile, "parse") as record:
+            builder = self.parse_columns()
+            record["rows"] = len(builder)
+        with stage(self.profile, "table", len(builder)):
+            if self.domain is not None:
+                builder.rebase(self.domain)
+            return builder.to_table(self.sparse_columns())
+
+    def report_parser(self):
+        """
+        Function `parse(filename, report_label=None, progress=None)` parsing
+        one report into a ColumnarTableBuilder; picklable so that reports can
+        be parsed in worker processes.
+        """
+        return partial(parse_rows_columns, type(self).PARSE, bug_filter=self.bug_filter or None,
+                       split_source=self.split_source)
+
+    def parse_columns(self):
+        if self.baseline:
+            return self.diff_columns()
+        parse = self.report_parser()
+        if not is_multi_report(self.filename):
+            return parse(self.filename, progress=self.progress)
+
+        paths = expand_report_paths(self.filename, self.pattern, self.is_report)
+        if not paths:
+            raise ValueError("No {} found in {}".format(self.DESCRIPTION, self.filename))
+        if self.profile is not None:
+            self.profile.info["reports"] = len(paths)
+        return merge_reports_columns(parse, paths, report_labels(paths), self.jobs, self.progress)
+
+    def diff_columns(self):
+        raise ValueError("{}s cannot be compared with a baseline".format(self.DESCRIPTION))
@@ -0,0 +1,105 @@
+"""
+Bug counts of a report table per file, class, category and bug type, the
+rank histogram and the hotspots, computed with NumPy over the encoded
+columns of the table.
+"""
+import numpy as np
+from Orange.data import Table, Domain, ContinuousVariable, DiscreteVariable, StringVariable
+
+#Summary groups and the column they count
+GROUP_COLUMNS = [
+    ("file", "SourceFile"),
+    ("class", "BugClass"),
+    ("category", "Category"),
+    ("type", "BugType"),
+]
+RANK_GROUP = "rank"
+HOTSPOT_GROUP = "hotspot"
+
+#Ranks go from 1 (scariest) to 20; a bug weighs 21 - rank in the scores
+MAX_RANK = 20
+
+SUMMARY_DOMAIN = Domain(
+    [DiscreteVariable("Group", values=[group for group, _ in GROUP_COLUMNS] + [RANK_GROUP, HOTSPOT_GROUP]),
+     ContinuousVariable("Bugs", number_of_decimals=0),
+     ContinuousVariable("Score", number_of_decimals=0),
+     ContinuousVariable("MeanRank")],
+    metas=[StringVariable("Name")])
+
+
+def column_codes(table, name):
+    """
+    (values, codes) of a column: the distinct values and the index of each
+    row's value (NaN when missing). Discrete columns are used as they are;
+    `path:line` SourceFile strings are reduced to the path.
+    """
+    var = table.domain[name]
+    column = table.get_column(var)
+    if var.is_discrete:
+        return list(var.values), column.astype(float)
+    column = np.asarray(column, dtype=str)
+    if name == "SourceFile":
+        column = np.char.rpartition(column, ":")[:, 0]
+    values, codes = np.unique(column, return_inverse=True)
+    codes = codes.astype(float)
+    if len(values) and values[0] == "":
+        codes[codes == 0] = np.nan
+        codes -= 1
+        values = values[1:]
+    return list(values), codes
+
+
+def _group_rows(group, values, codes, ranks, weights):
+    valid = ~np.isnan(codes)
+    codes = codes[valid].astype(np.intp)
+    ranks, weights = ranks[valid], weights[valid]
+    ranked = ~np.isnan(ranks)
+    counts = np.bincount(codes, minlength=len(values))
+    scores = np.bincount(codes, weights=weights, minlength=len(values))
+    rank_sums = np.bincount(codes[ranked], weights=ranks[ranked], minlength=len(values))
+    rank_counts = np.bincount(codes[ranked], minlength=len(values))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_ranks = rank_sums / rank_counts
+    order = np.argsort(-counts, kind="stable")
+    order = order[counts[order] > 0]
+    return [(group, counts[i], scores[i], mean_ranks[i], values[i]) for i in order]
+
+
+def summarize(table, top=20):
+    """
+    Summary table of the bugs of `table`: one row per file, class, category
+    and bug type with its bug count, severity score (sum of 21 - rank) and
+    mean rank, one row per rank, and the `top` files with the highest score
+    as hotspots.
+    """
+    rows = []
+    if "Rank" in table.domain:
+        ranks = table.get_column(table.domain["Rank"]).astype(float)
+    else:
+        ranks = np.full(len(table), np.nan)
+    weights = np.where(np.isnan(ranks), 1, MAX_RANK + 1 - np.nan_to_num(ranks))
+
+    file_rows = []
+    for group, name in GROUP_COLUMNS:
+        if name not in table.domain:
+            continue
+        values, codes = column_codes(table, name)
+        group_rows = _group_rows(group, values, codes, ranks, weights)
+        if group == "file":
+            file_rows = group_rows
+        rows += group_rows
+
+    rank_values, rank_counts = np.unique(ranks[~np.isnan(ranks)], return_counts=True)
+    rows += [(RANK_GROUP, count, count * (MAX_RANK + 1 - rank), rank, "{:g}".format(rank))
+             for rank, count in zip(rank_values, rank_counts)]
+
+    hotspots = sorted(file_rows, key=lambda row: -row[2])[:top]
+    rows += [(HOTSPOT_GROUP,) + row[1:] for row in hotspots]
+
+    if not rows:
+        return Table.from_domain(SUMMARY_DOMAIN, 0)
+    group_index = {value: i for i, value in enumerate(SUMMARY_DOMAIN["Group"].values)}
+    X = np.array([[group_index[group], count, score, mean_rank]
+                  for group, count, score, mean_rank, _ in rows], dtype=float)
+    metas = np.array([[name] for *_, name in rows], dtype=object)
+    return Table.from_numpy(SUMMARY_DOMAIN, X, None, metas)
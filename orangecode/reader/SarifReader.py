@@ -0,0 +1,11 @@
+from orangecode.reader.SarifUtil import parse_sarif_report, sniff_sarif
+from orangecode.reader.ReportReader import ReportReader
+
+class SarifReader(ReportReader):
+    """Reader for SARIF reports"""
+
+    EXTENSIONS = ('.sarif', '.sarif.json', '.sarif.gz', '.sarif.json.gz', '.sarif.bz2', '.sarif.xz')
+    DESCRIPTION = 'SARIF report'
+    PATTERN = "*.sarif*"
+    PARSE = staticmethod(parse_sarif_report)
+    SNIFF = staticmethod(sniff_sarif)
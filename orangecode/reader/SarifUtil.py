@@ -0,0 +1,198 @@
+"""
+Streaming parser of SARIF reports (CodeQL, Semgrep, ...). The `results`
+arrays are decoded one result at a time, so gigabyte reports are read in
+constant memory; the rest of the document is skipped or kept if small.
+"""
+import codecs
+import json
+
+from orangecode.reader.Schema import bug_row
+from orangecode.reader.ReportFiles import open_report, sniff
+
+READ_SIZE = 1024 * 1024
+
+#SARIF levels mapped to the SpotBugs priorities (1 = high)
+LEVEL_PRIORITIES = {"error": "1", "warning": "2", "note": "3", "none": "3"}
+
+#SARIF ranks go from 0 to 100 (most important); SpotBugs ranks from 1 (scariest) to 20
+MAX_SARIF_RANK = 100
+MAX_RANK = 20
+
+def spotbugs_rank(rank):
+    """SpotBugs rank (1-20) of a SARIF rank (0-100), "" when it is missing or invalid (-1)."""
+    try:
+        rank = float(rank)
+    except (TypeError, ValueError):
+        return ""
+    if not 0 <= rank <= MAX_SARIF_RANK:
+        return ""
+    return str(1 + round((MAX_SARIF_RANK - rank) * (MAX_RANK - 1) / MAX_SARIF_RANK))
+
+def sniff_sarif(head):
+    """True if `head`, the start of a file, is the start of a SARIF report."""
+    head = head.lstrip(codecs.BOM_UTF8 + b" \t\r\n")
+    return head.startswith(b"{") and b"sarif" in head.lower()
+
+def is_sarif_report(filename, sniff_size=4096):
+    return sniff_sarif(sniff(filename, sniff_size))
+
+class JsonStream:
+    """
+    Incremental reader of a JSON document from a binary stream. Values are
+    decoded with `json.JSONDecoder.raw_decode` as soon as they are complete;
+    the enclosing objects and arrays are walked token by token.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=READ_SIZE):
+        """Read more text; return False at the end of the stream."""
+        if self.eof:
+            return False
+        data = self.stream.read(size)
+        self.eof = not data
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+        return not self.eof or bool(self.buffer)
+
+    def peek(self):
+        """Next non-whitespace character ("" at the end of the document)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError("Invalid SARIF report: expected {!r}, found {!r}".format(chars, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete value."""
+        self.peek()
+        size = READ_SIZE
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                end = None
+            #A number may continue in the next chunk
+            if end is not None and (end < len(self.buffer) or self.eof):
+                self.pos = end
+                return value
+            self._fill(size)
+            #Grow the reads so that large values are decoded in linear time
+            size = max(size, len(self.buffer))
+
+    def members(self):
+        """Iterate over the keys of an object; the caller consumes each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def items(self):
+        """Iterate over the elements of an array; the caller consumes each value."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.expect(",]") == "]":
+                return
+
+def iter_sarif_results(filename, progress=None):
+    """
+    Yield (result, rules) for every result of every run of a SARIF report,
+    where `rules` maps the rule ids and indices of the run to the rules
+    (known only if the run's `tool` precedes its `results`, as usual).
+    `filename` may be a path (see ReportFiles.open_report) or a binary stream.
+    """
+    if hasattr(filename, "read"):
+        yield from _iter_sarif_results(JsonStream(filename))
+        return
+    source = open_report(filename, progress)
+    try:
+        yield from _iter_sarif_results(JsonStream(source))
+    finally:
+        source.close()
+
+def _iter_sarif_results(stream):
+    for key in stream.members():
+        if key != "runs":
+            stream.value()
+            continue
+        for _ in stream.items():
+            rules = {}
+            for run_key in stream.members():
+                if run_key == "results":
+                    for _ in stream.items():
+                        yield stream.value(), rules
+                elif run_key == "tool":
+                    rules.update(_rules(stream.value()))
+                else:
+                    stream.value()
+
+def _rules(tool):
+    rules = {}
+    for index, rule in enumerate(tool.get("driver", {}).get("rules", [])):
+        rules[index] = rule
+        if "id" in rule:
+            rules[rule["id"]] = rule
+    return rules
+
+def result_to_row(result, rules):
+    rule = rules.get(result.get("ruleIndex"), rules.get(result.get("ruleId"), {}))
+    rule_id = result.get("ruleId") or rule.get("id", "")
+    level = result.get("level") or rule.get("defaultConfiguration", {}).get("level", "warning")
+    tags = rule.get("properties", {}).get("tags", [])
+    rank = result.get("rank", "")
+
+    bug_class = ""
+    method = ""
+    locations = result.get("locations") or [{}]
+    physical = locations[0].get("physicalLocation", {})
+    path = physical.get("artifactLocation", {}).get("uri", "")
+    line = physical.get("region", {}).get("startLine", "")
+    for logical in locations[0].get("logicalLocations", []):
+        kind = logical.get("kind")
+        if kind in ("function", "member") and not method:
+            method = logical.get("name", "")
+        elif kind in ("type", "namespace", "module", None) and not bug_class:
+            bug_class = logical.get("fullyQualifiedName") or logical.get("name", "")
+
+    bug_id = None
+    fingerprints = result.get("partialFingerprints") or result.get("fingerprints")
+    if fingerprints:
+        key = min(fingerprints)
+        bug_id = "{}:{}".format(key, fingerprints[key])
+    elif result.get("guid"):
+        bug_id = result["guid"]
+
+    return bug_row(path, line, bug_class, method, rule_id, LEVEL_PRIORITIES.get(level, ""),
+                   spotbugs_rank(rank), tags[0] if tags else "", bug_id=bug_id)
+
+def parse_sarif_report(filename, callback, progress=None):
+    """Parse a SARIF report and call `callback` with one row per result."""
+    for result, rules in iter_sarif_results(filename, progress):
+        callback(result_to_row(result, rules))
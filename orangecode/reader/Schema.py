@@ -0,0 +1,68 @@
+"""
+Column types and roles shared by the report parsers and the table builder.
+Kept free of Orange imports so the command line export can use it.
+"""
+import hashlib
+
+DISCRETE = "discrete"
+CONTINUOUS = "continuous"
+STRING = "string"
+
+ATTRIBUTE = "attribute"
+CLASS = "class"
+META = "meta"
+
+#Common schema of the rows produced by every report parser
+BUG_COLUMNS = [
+    ("SourceFile", STRING, META),
+    ("BugClass", DISCRETE, ATTRIBUTE),
+    ("BugMethod", DISCRETE, ATTRIBUTE),
+    ("BugType", DISCRETE, ATTRIBUTE),
+    ("Priority", DISCRETE, ATTRIBUTE),
+    ("Rank", CONTINUOUS, ATTRIBUTE),
+    ("Category", DISCRETE, ATTRIBUTE),
+    ("SinkMethod", DISCRETE, ATTRIBUTE),
+    ("UnknownSource", DISCRETE, ATTRIBUTE),
+    ("BugId", STRING, META),
+]
+
+#Replace SourceFile when it is split: the path interned as a categorical
+#variable and the line as a number. Metas like the column they replace, so
+#learners do not get them as features
+SPLIT_SOURCE_COLUMNS = [
+    ("SourceFile", DISCRETE, META),
+    ("Line", CONTINUOUS, META),
+]
+
+#High-cardinality columns one-hot encoded in sparse tables
+SPARSE_COLUMNS = ("BugClass", "BugMethod", "SinkMethod")
+
+#Added when several reports are merged into one table
+REPORT_FILE_COLUMN = ("ReportFile", DISCRETE, META)
+
+
+def bug_row(source_path, line, bug_class, method, bug_type, priority, rank, category,
+            sink_method="", unknown_source="", bug_id=None):
+    """
+    Row of BUG_COLUMNS. Without `bug_id` (a stable identifier given by the
+    tool), the id is derived from the content of the row.
+    """
+    row = ["{}:{}".format(source_path, line), bug_class, method, bug_type, priority, rank, category,
+           sink_method, unknown_source]
+    if bug_id is None:
+        bug_id = hashlib.md5("|".join(row).encode("utf-8")).hexdigest()
+    row.append(bug_id)
+    return row
+
+
+def bug_columns(split_source=False):
+    """BUG_COLUMNS, with SourceFile split into SourceFile and Line if `split_source`."""
+    if split_source:
+        return SPLIT_SOURCE_COLUMNS + BUG_COLUMNS[1:]
+    return list(BUG_COLUMNS)
+
+
+def split_source_row(row):
+    """Row of `bug_columns(split_source=True)` from a row of BUG_COLUMNS."""
+    path, _, line = row[0].rpartition(":")
+    return [path, line] + row[1:]
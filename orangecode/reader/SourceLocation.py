@@ -0,0 +1,135 @@
+"""
+The `path:line` location of the bugs of tables whose SourceFile column is
+split (see Schema.bug_columns), computed only when a widget asks for it, and
+the detection of the columns holding the location in any table.
+"""
+import numpy as np
+from Orange.data import Domain, StringVariable
+
+
+class SourceLocation:
+    """
+    compute_value of a string variable holding `path:line`, built from the
+    categorical SourceFile and numeric Line variables of the source domain.
+    """
+
+    def __init__(self, source_file, line):
+        self.source_file = source_file
+        self.line = line
+
+    def __call__(self, data):
+        files = data.get_column(self.source_file)
+        lines = data.get_column(self.line)
+        values = np.array([""] + list(self.source_file.values), dtype=object)
+        paths = values[np.where(np.isnan(files), 0, files + 1).astype(int)]
+        return np.array(["{}:{}".format(path, "" if np.isnan(line) else int(line))
+                         for path, line in zip(paths, lines)], dtype=object)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and \
+            self.source_file == other.source_file and self.line == other.line
+
+    def __hash__(self):
+        return hash((type(self), self.source_file, self.line))
+
+
+def has_split_source(domain):
+    return "Line" in domain and "SourceFile" in domain and domain["SourceFile"].is_discrete
+
+
+def location_variable(domain, name="Location"):
+    """String variable computing `path:line` from the split SourceFile and Line of `domain`."""
+    return StringVariable(name, compute_value=SourceLocation(domain["SourceFile"], domain["Line"]))
+
+
+def with_location(table, name="Location"):
+    """`table` with the `path:line` location added as a meta column."""
+    domain = table.domain
+    location = location_variable(domain, name)
+    return table.transform(Domain(domain.attributes, domain.class_vars, domain.metas + (location,)))
+
+
+def location_share(values):
+    """
+    Share of `values` (strings) of the form `path:line`, where the path has
+    a directory separator or an extension.
+    """
+    if not len(values):
+        return 0
+    head, sep, tail = np.char.rpartition(np.asarray(values, dtype=str), ":").T
+    path_like = (np.char.find(head, "/") >= 0) | (np.char.find(head, "\\") >= 0) | \
+        (np.char.find(head, ".") >= 0)
+    return np.mean((sep == ":") & path_like & np.char.isdigit(tail))
+
+
+def _column_strings(table, var):
+    column = table.get_column(var)
+    if var.is_discrete:
+        codes = column[~np.isnan(column)].astype(int)
+        return np.array(var.values, dtype=str)[codes] if len(var.values) else np.empty(0, dtype=str)
+    return np.asarray(column, dtype=str)
+
+
+def find_location_columns(table, sample_size=1000):
+    """
+    (file variable, line variable) of the columns of `table` holding the
+    source location: the split SourceFile and Line columns, else, guessed
+    from its first `sample_size` rows, the string or discrete column other
+    than BugId whose values most often look like `path:line` (the line
+    variable is then None). Returns None when no column looks like a location.
+    """
+    domain = table.domain
+    if has_split_source(domain):
+        return domain["SourceFile"], domain["Line"]
+    sample = table[:sample_size]
+    best, best_share = None, 0
+    for var in domain.attributes + domain.metas:
+        if not (var.is_string or var.is_discrete) or var.name == "BugId":
+            continue
+        share = location_share(_column_strings(sample, var))
+        if share > best_share:
+            best, best_share = var, share
+    if best is not None:
+        return best, None
+    return None
+
+
+def location_paths(table, file_var, line_var=None):
+    """Paths of the rows of `table` with a location (see row_location), in row order."""
+    values = _column_strings(table, file_var)
+    if line_var is None and len(values):
+        head, sep, tail = np.char.rpartition(values, ":").T
+        located = (sep == ":") & (np.char.str_len(head) > 0) & np.char.isdigit(tail)
+        values = np.where(located, head, values)
+    return values[np.char.str_len(values) > 0] if len(values) else values
+
+
+def prefetch_paths(table, file_var, line_var=None, rows=8, files=8):
+    """
+    Paths worth reading ahead when the first row of `table` is displayed:
+    those of the next `rows` rows, then the `files` most frequent ones.
+    """
+    paths = location_paths(table, file_var, line_var)
+    if not len(paths):
+        return []
+    values, counts = np.unique(paths, return_counts=True)
+    frequent = values[np.argsort(-counts, kind="stable")[:files]]
+    return list(dict.fromkeys(paths[1:rows + 1].tolist() + frequent.tolist()))
+
+
+def row_location(row, file_var, line_var=None):
+    """
+    (path, line) of a row given the columns found by find_location_columns;
+    the line is -1 when unknown and the path "" when missing.
+    """
+    value = row[file_var]
+    if value.value is None or (file_var.is_discrete and np.isnan(value)):
+        return "", -1
+    path = str(value.value)
+    if line_var is None:
+        head, sep, tail = path.rpartition(":")
+        if sep and head and tail.isdigit():
+            return head, int(tail)
+        return path, -1
+    line = row[line_var]
+    return path, -1 if np.isnan(line) else int(line)
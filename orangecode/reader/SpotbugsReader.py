@@ -1,215 +1,177 @@
-import re
-from collections import Counter
+from functools import partial
 
 import numpy as np
-from Orange.data import Table, Domain, ContinuousVariable, DiscreteVariable, StringVariable, Flags, Variable, \
-    TimeVariable, MISSING_VALUES
-from Orange.data.io import FileFormat, _RE_DISCRETE_LIST, guess_data_type, sanitize_variable
-from Orange.util import flatten, namegen
-
-
-
-from orangecode.reader.SpotbugsUtil import parse_spotbugs_report
-
-class SpotbugsReader(FileFormat):
-    """Reader for comma separated files"""
-
-    EXTENSIONS = ('.xml',)
+import scipy.sparse as sp
+from Orange.data import Table
+
+from orangecode.reader.SpotbugsUtil import parse_spotbugs_report, bug_instance_id, sniff_spotbugs, \
+    peek_spotbugs_summary, default_backend, diff_spotbugs_reports, iter_bug_instances, split_skip, bug_to_row, \
+    STATUS_COLUMN
+from orangecode.reader.ReportFiles import is_multi_report
+from orangecode.reader.ReportReader import ReportReader, merge_reports_columns, report_builder, row_appender
+from orangecode.reader.TableBuilder import ColumnarTableBuilder, widen_sparse
+from orangecode.Instrumentation import stage
+
+def parse_report_columns(filename, report_label=None, progress=None, bug_filter=None, backend=None,
+                         split_source=False):
+    """
+    Parse one report into a ColumnarTableBuilder. When `report_label` is
+    given, it is added to every row as the ReportFile column. Only the bugs
+    accepted by the optional BugFilter are kept. With `split_source`,
+    SourceFile is split into SourceFile and Line.
+    Module level so it can run in a worker process.
+    """
+    builder, append = report_builder(report_label, split_source)
+    parse_spotbugs_report(filename,append,skip=bug_filter or None,progress=progress,backend=backend)
+    return builder
+
+def parse_reports_columns(paths, labels, jobs=None, progress=None, bug_filter=None, backend=None,
+                          split_source=False):
+    """
+    Parse several reports in a process pool of `jobs` workers (all cores by
+    default) and merge them into a single builder, in the order of `paths`.
+    See ReportReader.merge_reports_columns.
+    """
+    parse = partial(parse_report_columns, bug_filter=bug_filter, backend=backend, split_source=split_source)
+    return merge_reports_columns(parse, paths, labels, jobs, progress)
+
+def _number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+def _same_number(a, b):
+    return a == b or (np.isnan(a) and np.isnan(b))
+
+def _line_rank_columns(table):
+    """Line and Rank of every row of a report table as floats (NaN when missing)."""
+    domain = table.domain
+    if "Line" in domain:
+        lines = table.get_column(domain["Line"]).astype(float)
+    else:
+        lines = [_number(str(source).rpartition(":")[2]) for source in table.get_column(domain["SourceFile"])]
+    ranks = table.get_column(domain["Rank"]).astype(float)
+    return lines, ranks
+
+class SpotbugsReader(ReportReader):
+    """Reader for SpotBugs XML reports"""
+
+    EXTENSIONS = ('.xml', '.xml.gz', '.xml.bz2', '.xml.xz', '.zip')
     DESCRIPTION = 'SpotBugs XML report'
-    SUPPORT_SPARSE_DATA = True
-
-
-    def read(self):
-
-        exported_data = []
-
-        def append_bug(info):
-            exported_data.append(info)
+    PATTERN = "*.xml"
+    SNIFF = staticmethod(sniff_spotbugs)
 
-        parse_spotbugs_report(self.filename,append_bug)
 
-        headers=[["m#SourceFile","D#BugClass","D#BugMethod","D#BugType","D#Priority","C#Rank","D#Category","D#SinkMethod","D#UnknownSource"]]
-        #         ["d"         ,"d"      ,"d"       ,"c"   ,"d"       ,"d"         ,"d"]]
-        return self.data_table(exported_data,headers)
-
-
-    # Matches discrete specification where all the values are listed, space-separated
-    _RE_DISCRETE_LIST = re.compile(r'^\s*[^\s]+(\s[^\s]+)+\s*$')
-    _RE_TYPES = re.compile(r'^\s*({}|{}|)\s*$'.format(
-        _RE_DISCRETE_LIST.pattern,
-        '|'.join(flatten(getattr(vartype, 'TYPE_HEADERS') for vartype in Variable.registry.values()))
-    ))
-    _RE_FLAGS = re.compile(r'^\s*( |{}|)*\s*$'.format(
-        '|'.join(flatten(filter(None, i) for i in Flags.ALL.items()))
-    ))
-
-    @classmethod
-    def data_table(cls, data, headers=None):
+    def __init__(self, filename, cache=None, pattern="*.xml", jobs=None, bug_filter=None, backend=None,
+                 baseline=None, split_source=False, sparse=False, domain=None):
         """
-        Return Orange.data.Table given rows of `headers` (iterable of iterable)
-        and rows of `data` (iterable of iterable; if ``numpy.ndarray``, might
-        as well **have it sorted column-major**, e.g. ``order='F'``).
-        Basically, the idea of subclasses is to produce those two iterables,
-        however they might.
-        If `headers` is not provided, the header rows are extracted from `data`,
-        assuming they precede it.
+        See ReportReader. `backend` names the XML parser (SpotbugsUtil.PARSER_BACKENDS); lxml
+        is used when it is installed. With a `baseline` report, the table
+        holds the bugs of both reports with a Status column (new, fixed or
+        unchanged); both must then be single reports.
         """
-        if not headers:
-            headers, data = cls.parse_headers(data)
-
-        # Consider various header types (single-row, two-row, three-row, none)
-        if len(headers) == 3:
-            names, types, flags = map(list, headers)
-        else:
-            if len(headers) == 1:
-                HEADER1_FLAG_SEP = '#'
-                # First row format either:
-                #   1) delimited column names
-                #   2) -||- with type and flags prepended, separated by #,
-                #      e.g. d#sex,c#age,cC#IQ
-                _flags, names = zip(*[i.split(HEADER1_FLAG_SEP, 1)
-                                      if HEADER1_FLAG_SEP in i else ('', i)
-                                      for i in headers[0]]
-                                   )
-                names = list(names)
-            elif len(headers) == 2:
-                names, _flags = map(list, headers)
-            else:
-                # Use heuristics for everything
-                names, _flags = [], []
-            types = [''.join(filter(str.isupper, flag)).lower() for flag in _flags]
-            flags = [Flags.join(filter(str.islower, flag)) for flag in _flags]
-
-        # Determine maximum row length
-        rowlen = max(map(len, (names, types, flags)))
-
-        def _equal_length(lst):
-            lst.extend(['']*(rowlen - len(lst)))
-            return lst
-
-        # Ensure all data is of equal width in a column-contiguous array
-        data = np.array([_equal_length(list(row)) for row in data if any(row)],
-                        copy=False, dtype=object, order='F')
-
-        # Data may actually be longer than headers were
-        try:
-            rowlen = data.shape[1]
-        except IndexError:
-            pass
-        else:
-            for lst in (names, types, flags):
-                _equal_length(lst)
-
-        NAMEGEN = namegen('Feature ', 1)
-        Xcols, attrs = [], []
-        Mcols, metas = [], []
-        Ycols, clses = [], []
-        Wcols = []
-
-        # Rename variables if necessary
-        # Reusing across files still works if both files have same duplicates
-        name_counts = Counter(names)
-        del name_counts[""]
-        if len(name_counts) != len(names) and name_counts:
-            uses = {name: 0 for name, count in name_counts.items() if count > 1}
-            for i, name in enumerate(names):
-                if name in uses:
-                    uses[name] += 1
-                    names[i] = "{}_{}".format(name, uses[name])
-
-        # Iterate through the columns
-        for col in range(rowlen):
-            flag = Flags(Flags.split(flags[col]))
-            if flag.i:
-                continue
-
-            type_flag = types and types[col].strip()
-            try:
-                orig_values = [np.nan if i in MISSING_VALUES else i
-                               for i in (i.strip() for i in data[:, col])]
-            except IndexError:
-                # No data instances leads here
-                orig_values = []
-                # In this case, coltype could be anything. It's set as-is
-                # only to satisfy test_table.TableTestCase.test_append
-                coltype = DiscreteVariable
-
-            coltype_kwargs = {}
-            valuemap = []
-            values = orig_values
-
-            if type_flag in StringVariable.TYPE_HEADERS:
-                coltype = StringVariable
-            elif type_flag in ContinuousVariable.TYPE_HEADERS:
-                coltype = ContinuousVariable
-                try:
-                    values = [float(i) for i in orig_values]
-                except ValueError:
-                    for row, num in enumerate(orig_values):
-                        try:
-                            float(num)
-                        except ValueError:
-                            break
-                    raise ValueError('Non-continuous value in (1-based) '
-                                     'line {}, column {}'.format(row + len(headers) + 1,
-                                                                 col + 1))
-
-            elif type_flag in TimeVariable.TYPE_HEADERS:
-                coltype = TimeVariable
-
-            elif (type_flag in DiscreteVariable.TYPE_HEADERS or
-                  _RE_DISCRETE_LIST.match(type_flag)):
-                coltype = DiscreteVariable
-                if _RE_DISCRETE_LIST.match(type_flag):
-                    valuemap = Flags.split(type_flag)
-                    coltype_kwargs.update(ordered=True)
-                else:
-                    valuemap = sorted(set(orig_values) - {np.nan})
+        super().__init__(filename, cache, pattern, jobs, bug_filter, baseline, split_source, sparse,
+                         domain)
+        self.backend = backend or default_backend()
+
+    def cache_variant(self):
+        """Describe the options that change the table built from a report."""
+        variant = "spotbugs:" + ",".join(name for name, _, _ in self.columns())
+        if self.sparse:
+            variant += ":sparse"
+        if self.bug_filter:
+            variant += ":" + self.bug_filter.describe()
+        return variant
+
+    def peek(self):
+        """
+        Summary of a single report (see SpotbugsUtil.peek_spotbugs_summary)
+        read without parsing its bugs, or None for several reports.
+        """
+        if is_multi_report(self.filename):
+            return None
+        return peek_spotbugs_summary(self.filename)
 
+    def read_incremental(self, previous):
+        """
+        Reload a single report on top of `previous`, the table read from an
+        earlier version of it. Bugs still present (matched on BugId) at the
+        same line and rank keep their rows and row ids; rows are only built
+        for the new and the changed bugs. Rows of `previous` rejected by the
+        current filter are removed.
+        """
+        bug_id_column = [var.name for var in previous.domain.metas].index("BugId")
+        index = {bug_id: row for row, bug_id in enumerate(previous.metas[:, bug_id_column])}
+        keep = np.zeros(len(previous), dtype=bool)
+        lines, ranks = _line_rank_columns(previous)
+
+        reject, rejected = split_skip(self.bug_filter or None)
+
+        def known(bug):
+            if rejected is not None and rejected(bug):
+                return True
+            #pop() so that a repeated id is handled as a new bug
+            row = index.pop(bug_instance_id(bug), None)
+            if row is None:
+                return False
+            #The instance hash does not change with the line or the rank
+            source_line = bug.find("SourceLine")
+            line = _number(source_line.get("start", "") if source_line is not None else "")
+            if not (_same_number(line, lines[row]) and _same_number(_number(bug.get("rank", "")), ranks[row])):
+                return False
+            keep[row] = True
+            return True
+
+        builder, append = report_builder(split_source=self.split_source, domain=previous.domain)
+        with stage(self.profile, "parse") as record:
+            self._record_backend()
+            for bug in iter_bug_instances(self.filename, self.progress, self.backend, reject):
+                if not known(bug):
+                    append(bug_to_row(bug))
+            record["rows"] = len(builder)
+        with stage(self.profile, "table", len(builder)):
+            added = builder.to_table(self.sparse_columns())
+
+        self.changes = (len(added), int(len(previous) - keep.sum()))
+        if not len(added) and keep.all():
+            return previous
+
+        with stage(self.profile, "merge", len(added) + int(keep.sum())):
+            if sp.issparse(added.X):
+                X = sp.vstack((widen_sparse(previous.X[keep], previous.domain, added.domain), added.X),
+                              format="csr")
             else:
-                # No known type specified, use heuristics
-                valuemap, values, coltype = guess_data_type(orig_values)
-
-            if flag.m or coltype is StringVariable:
-                append_to = (Mcols, metas)
-            elif flag.w:
-                append_to = (Wcols, None)
-            elif flag.c:
-                append_to = (Ycols, clses)
-            else:
-                append_to = (Xcols, attrs)
-
-            cols, domain_vars = append_to
-            cols.append(col)
-
-            existing_var, new_var_name = None, None
-            if domain_vars is not None:
-                existing_var = names and names[col]
-                if not existing_var:
-                    new_var_name = next(NAMEGEN)
-
-            values, var = sanitize_variable(
-                valuemap, values, orig_values, coltype, coltype_kwargs,
-                domain_vars, existing_var, new_var_name, data)
-            if domain_vars is not None:
-                var.attributes.update(flag.attributes)
-                domain_vars.append(var)
-
-            # Write back the changed data. This is needeed to pass the
-            # correct, converted values into Table.from_numpy below
-            try:
-                data[:, col] = values
-            except IndexError:
-                pass
-
-        domain = Domain(attrs, clses, metas)
-
-        if not data.size:
-            return Table.from_domain(domain, 0)
-
-        table = Table.from_numpy(domain,
-                                 data[:, Xcols].astype(float, order='C'),
-                                 data[:, Ycols].astype(float, order='C'),
-                                 data[:, Mcols].astype(object, order='C'),
-                                 data[:, Wcols].astype(float, order='C'))
-        return table
\ No newline at end of file
+                X = np.vstack((previous.X[keep], added.X))
+            table = Table.from_numpy(added.domain, X,
+                                     np.concatenate((previous.Y[keep], added.Y)),
+                                     np.vstack((previous.metas[keep], added.metas)))
+            table.ids = np.concatenate((previous.ids[keep], added.ids))
+        table.name = previous.name
+        table.attributes = getattr(previous, 'attributes', {})
+        return table
+
+    def _record_backend(self):
+        if self.profile is not None:
+            self.profile.info["parser"] = self.backend
+
+    def report_parser(self):
+        return partial(parse_report_columns, bug_filter=self.bug_filter or None, backend=self.backend,
+                       split_source=self.split_source)
+
+    def parse_columns(self):
+        self._record_backend()
+        return super().parse_columns()
+
+    def diff_columns(self):
+        """Parse the report and the baseline into one builder with a Status column."""
+        if is_multi_report(self.filename) or is_multi_report(self.baseline):
+            raise ValueError("Only single reports can be compared with a baseline")
+        builder = ColumnarTableBuilder(self.columns() + [STATUS_COLUMN])
+        counts = diff_spotbugs_reports(self.filename, self.baseline, row_appender(builder, self.split_source),
+                                       skip=self.bug_filter or None, backend=self.backend,
+                                       progress=self.progress)
+        self.changes = counts[:2]
+        if self.profile is not None:
+            self.profile.info.update(zip(("new", "fixed", "unchanged"), counts))
+        return builder
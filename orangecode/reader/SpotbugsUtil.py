@@ -1,41 +1,435 @@
-
+import os
+import re
 import xml.etree.ElementTree as ET
+from functools import partial
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+from orangecode.reader.Schema import DISCRETE, META, BUG_COLUMNS, REPORT_FILE_COLUMN, bug_row
+from orangecode.reader.ReportFiles import open_report, sniff, split_archive_member, DECOMPRESSORS
+
+#Schema of the rows produced by bug_to_row
+SPOTBUGS_COLUMNS = BUG_COLUMNS
+
+#Added when a report is compared with a baseline report
+STATUS_COLUMN = ("Status", DISCRETE, META)
+NEW, FIXED, UNCHANGED = "new", "fixed", "unchanged"
+
+def _etree_bug_instances(source, reject=None):
+    context = ET.iterparse(source, events=("start", "end"))
+    _, root = next(context)
+    depth = 0
+    rejected = None
+
+    for event, elem in context:
+        if event == "start":
+            depth += 1
+            if depth == 1 and reject is not None and elem.tag == "BugInstance" and reject(elem.attrib):
+                rejected = elem
+            continue
+        depth -= 1
+        if depth == 1 and rejected is not None:
+            #Children of a rejected bug are dropped as soon as they are complete
+            rejected.clear()
+        elif depth == 0:
+            if elem.tag == "BugInstance" and elem is not rejected:
+                yield elem
+            rejected = None
+            #Finished top-level element (BugInstance, Project, Errors, ...)
+            root.clear()
+
+def _lxml_bug_instances(source, reject=None):
+    #lxml only reports the BugInstance elements; start events only to reject bugs early
+    events = ("end",) if reject is None else ("start", "end")
+    context = lxml_etree.iterparse(source, events=events, tag="BugInstance",
+                                   huge_tree=True, resolve_entities=False)
+    rejected = None
+    for event, elem in context:
+        parent = elem.getparent()
+        if parent.getparent() is not None:
+            continue
+        if event == "start":
+            if reject(elem.attrib):
+                rejected = elem
+            continue
+        if elem is not rejected:
+            yield elem
+        rejected = None
+        elem.clear(keep_tail=True)
+        #Drop the finished top-level elements
+        while elem.getprevious() is not None:
+            del parent[0]
+
+#Streaming parsers yielding the top-level BugInstance elements (ElementTree
+#compatible), fastest first. They take an optional predicate called with the
+#attributes of each BugInstance at its start tag: the bugs it accepts are not
+#yielded. ElementTree then drops their children as soon as they are parsed;
+#libxml2 still builds them, but no Python object is created for them.
+PARSER_BACKENDS = {}
+if lxml_etree is not None:
+    PARSER_BACKENDS["lxml"] = _lxml_bug_instances
+PARSER_BACKENDS["etree"] = _etree_bug_instances
+
+def default_backend():
+    """Name of the fastest installed parser backend."""
+    return next(iter(PARSER_BACKENDS))
+
+def sniff_spotbugs(head):
+    """True if `head`, the start of a file, is the start of a SpotBugs report."""
+    return b"<BugCollection" in head
+
+def is_spotbugs_report(filename, sniff_size=4096):
+    return sniff_spotbugs(sniff(filename, sniff_size))
+
+def peek_spotbugs_summary(filename, head_size=16384, tail_size=65536, max_tail_size=64 * 1024 * 1024):
+    """
+    Read the Project header and the FindBugsSummary of a report without
+    parsing its bugs. The summary is written at the end of the report, so
+    it is searched in the last `tail_size` bytes, doubling the window up to
+    `max_tail_size`. Compressed and archived reports cannot be read from
+    the end: only their header is returned.
+
+    Returns a dict with the project name, the SpotBugs version and, when
+    the summary was found, total_bugs, total_classes, num_packages and the
+    bug count of each package. Returns None if `filename` is not a report.
+    """
+    head = sniff(filename, head_size)
+    collection = _start_tag(head, b"BugCollection")
+    if collection is None:
+        return None
+    project = _start_tag(head, b"Project")
+    summary = {
+        "version": collection.get("version", ""),
+        "project": project.get("projectName", "") if project is not None else "",
+    }
+
+    archive, _ = split_archive_member(filename)
+    if archive is not None or os.path.splitext(filename)[1].lower() in DECOMPRESSORS:
+        return summary
+
+    element = _read_summary(filename, tail_size, max_tail_size)
+    if element is not None:
+        summary["total_bugs"] = int(element.get("total_bugs", 0))
+        summary["total_classes"] = int(element.get("total_classes", 0))
+        summary["num_packages"] = int(element.get("num_packages", 0))
+        summary["packages"] = {package.get("package", ""): int(package.get("total_bugs", 0))
+                               for package in element.iter("PackageStats")}
+    return summary
+
+def _start_tag(data, tag):
+    """Attributes of the first `tag` start tag in `data`, as an element."""
+    match = re.search(rb"<" + tag + rb"\b[^>]*?/?>", data)
+    if match is None:
+        return None
+    text = match.group(0)
+    if not text.endswith(b"/>"):
+        text = text[:-1] + b"/>"
+    try:
+        return ET.fromstring(text)
+    except ET.ParseError:
+        return None
+
+def _read_summary(filename, tail_size, max_tail_size):
+    with open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        while True:
+            start = max(0, size - tail_size)
+            f.seek(start)
+            tail = f.read()
+            begin = tail.rfind(b"<FindBugsSummary")
+            if begin >= 0:
+                break
+            if start == 0 or tail_size >= max_tail_size:
+                return None
+            tail_size *= 2
+
+    end = tail.find(b"</FindBugsSummary>", begin)
+    if end >= 0:
+        fragment = tail[begin:end + len(b"</FindBugsSummary>")]
+    else:
+        #Empty element (<FindBugsSummary .../>)
+        fragment = tail[begin:tail.find(b">", begin) + 1]
+    try:
+        return ET.fromstring(fragment)
+    except ET.ParseError:
+        return None
+
+def parse_spotbugs_report(filename,callback,streaming=True,skip=None,progress=None,backend=None):
+    """
+    Parse a SpotBugs XML report and call `callback` with one row per BugInstance.
+
+    In streaming mode (the default), the report is read incrementally and every
+    BugInstance is discarded as soon as its row has been produced. Memory usage
+    stays flat regardless of the report size. The DOM mode loads the full tree
+    first and is kept for comparison.
+
+    `skip` is an optional predicate called with each BugInstance element;
+    no row is built for the bugs it accepts. A BugFilter is applied to the
+    attributes of the bugs at their start tag in streaming mode (see
+    split_skip). `progress` is called with the percentage of the file
+    consumed so far (streaming mode only); it may raise to abort the parse.
+    `backend` names the streaming parser (see PARSER_BACKENDS); the fastest
+    installed one is used by default.
+    """
+
+    if streaming:
+        reject, skip = split_skip(skip)
+        bugs = iter_bug_instances(filename, progress, backend, reject)
+    elif hasattr(filename, "read"):
+        bugs = ET.parse(filename).getroot().findall("BugInstance")
+    else:
+        with open_report(filename) as source:
+            bugs = ET.parse(source).getroot().findall("BugInstance")
+
+    for bug in bugs:
+        if skip is not None and skip(bug):
+            continue
+        callback(bug_to_row(bug))
+
+def split_skip(skip):
+    """
+    (reject, skip) predicates for iter_bug_instances and the elements it
+    yields. A BugFilter is split into its attribute criteria, checked at the
+    start tag of each bug, and its prefixes, which need the children; any
+    other predicate is applied to the complete elements.
+    """
+    if not isinstance(skip, BugFilter):
+        return None, skip
+    reject = skip.rejects_attributes if skip.has_attribute_criteria() else None
+    return reject, skip.rejects_children if skip.prefixes else None
+
+def iter_bug_instances(filename, progress=None, backend=None, reject=None):
+    """
+    Yield the top-level BugInstance elements of a report one at a time.
+    The element is only valid until the next one is requested. `filename`
+    may be a path (see ReportFiles.open_report) or a binary stream. The
+    bugs whose attributes are accepted by the optional `reject` predicate
+    are skipped at their start tag (see PARSER_BACKENDS).
+    """
+    bug_instances = partial(PARSER_BACKENDS[backend or default_backend()], reject=reject)
+    if hasattr(filename, "read"):
+        yield from bug_instances(filename)
+        return
+    source = open_report(filename, progress)
+    try:
+        yield from bug_instances(source)
+    finally:
+        source.close()
+
+def bug_instance_id(bug):
+    """
+    Stable identifier of a BugInstance from its instanceHash, or None when
+    the report does not include hashes.
+    """
+    instance_hash = bug.attrib.get("instanceHash")
+    if not instance_hash:
+        return None
+    occurrence = bug.attrib.get("instanceOccurrenceNum", "0")
+    if occurrence in ("", "0"):
+        return instance_hash
+    return "{}-{}".format(instance_hash, occurrence)
+
+def _fallback_key(row):
+    #BugType, BugClass, BugMethod and SinkMethod of a bug_to_row row
+    return row[3], row[1], row[2], row[7]
+
+def diff_spotbugs_reports(filename, baseline, callback, skip=None, backend=None, progress=None):
+    """
+    Compare a report with a `baseline` report and call `callback` with the
+    row of every bug followed by its status: NEW or UNCHANGED for the bugs
+    of `filename`, then FIXED for the bugs of the baseline not found in it.
+
+    Bugs are matched on their instance hash. Bugs without a hash match the
+    baseline bugs without a hash on type, class, method and sink. Both
+    reports are read once, with dictionary lookups, so the comparison is
+    linear in their sizes. `skip` is applied to the bugs of both reports.
+    `progress` is called with the percentage of both reports read so far.
+
+    Returns the (new, fixed, unchanged) counts.
+    """
+    baseline_rows = []
+    matched = []
+    by_hash = {}
+    by_key = {}
+    baseline_progress = current_progress = None
+    if progress is not None:
+        baseline_progress = lambda value: progress(value / 2)
+        current_progress = lambda value: progress(50 + value / 2)
+
+    reject, skip = split_skip(skip)
+    for bug in iter_bug_instances(baseline, baseline_progress, backend, reject):
+        if skip is not None and skip(bug):
+            continue
+        row = bug_to_row(bug)
+        bug_id = bug_instance_id(bug)
+        if bug_id is None:
+            by_key.setdefault(_fallback_key(row), []).append(len(baseline_rows))
+        else:
+            #A repeated id keeps its first row, the others can only be fixed
+            by_hash.setdefault(bug_id, len(baseline_rows))
+        baseline_rows.append(row)
+        matched.append(False)
+
+    new = unchanged = 0
+    for bug in iter_bug_instances(filename, current_progress, backend, reject):
+        if skip is not None and skip(bug):
+            continue
+        row = bug_to_row(bug)
+        bug_id = bug_instance_id(bug)
+        index = by_hash.pop(bug_id, None) if bug_id is not None else None
+        if index is None:
+            candidates = by_key.get(_fallback_key(row))
+            if candidates:
+                index = candidates.pop()
+        if index is None:
+            new += 1
+            callback(row + [NEW])
+        else:
+            matched[index] = True
+            unchanged += 1
+            callback(row + [UNCHANGED])
+
+    fixed = 0
+    for row, found in zip(baseline_rows, matched):
+        if not found:
+            fixed += 1
+            callback(row + [FIXED])
+    return new, fixed, unchanged
+
+class BugFilter:
+    """
+    Selection of the bugs to load, applied to the BugInstance elements while
+    parsing so no row is built for the rejected bugs. An instance is a `skip`
+    predicate for parse_spotbugs_report: it returns True for rejected bugs.
+    When streaming, the rank, priority, category and type are checked on the
+    attributes of each bug at its start tag, so the bugs they reject are
+    never built (see PARSER_BACKENDS); only the prefixes need the children
+    of the accepted bugs.
+
+    `min_rank` and `max_rank` bound the bug rank (1 is the most severe).
+    `priorities`, `categories` and `bug_types` are sets of accepted values
+    (all values when empty). `prefixes` are accepted prefixes of the class
+    name (e.g. ``com.example.``) or of the source path (``com/example/``).
+    """
+
+    def __init__(self, min_rank=None, max_rank=None, priorities=(), categories=(), bug_types=(), prefixes=()):
+        self.min_rank = min_rank
+        self.max_rank = max_rank
+        self.priorities = frozenset(priorities)
+        self.categories = frozenset(categories)
+        self.bug_types = frozenset(bug_types)
+        self.prefixes = tuple(prefixes)
+
+    def __bool__(self):
+        """True if the filter rejects anything."""
+        return self.has_attribute_criteria() or bool(self.prefixes)
+
+    def has_attribute_criteria(self):
+        """True if the filter rejects bugs on their attributes (all but the prefixes)."""
+        return self.min_rank is not None or self.max_rank is not None or bool(
+            self.priorities or self.categories or self.bug_types)
+
+    def describe(self):
+        """Canonical description, e.g. to key cached tables."""
+        return "rank={}-{};priority={};category={};type={};prefix={}".format(
+            self.min_rank, self.max_rank, ",".join(sorted(self.priorities)),
+            ",".join(sorted(self.categories)), ",".join(sorted(self.bug_types)), ",".join(self.prefixes))
+
+    def __call__(self, bug):
+        return self.rejects_attributes(bug.attrib) or self.rejects_children(bug)
+
+    def rejects_attributes(self, attrib):
+        """True if the filter rejects a bug from the attributes of its BugInstance element."""
+        if self.min_rank is not None or self.max_rank is not None:
+            try:
+                rank = float(attrib.get("rank", ""))
+            except ValueError:
+                return True
+            if self.min_rank is not None and rank < self.min_rank:
+                return True
+            if self.max_rank is not None and rank > self.max_rank:
+                return True
+        if self.priorities and attrib.get("priority", "") not in self.priorities:
+            return True
+        if self.categories and attrib.get("category", "") not in self.categories:
+            return True
+        if self.bug_types and attrib.get("type", "") not in self.bug_types:
+            return True
+        return False
+
+    def rejects_children(self, bug):
+        """True if the filter rejects a complete BugInstance on its prefixes."""
+        if not self.prefixes:
+            return False
+        source_line = bug.find("SourceLine")
+        if source_line is None:
+            return True
+        return not (source_line.get("classname", "").startswith(self.prefixes)
+                    or source_line.get("sourcepath", "").startswith(self.prefixes))
+
+    def rejects_row(self, row):
+        """True if the filter rejects a row of BUG_COLUMNS."""
+        source_file, bug_class, _, bug_type, priority, rank, category = row[:7]
+        if self.min_rank is not None or self.max_rank is not None:
+            try:
+                rank = float(rank)
+            except ValueError:
+                return True
+            if self.min_rank is not None and rank < self.min_rank:
+                return True
+            if self.max_rank is not None and rank > self.max_rank:
+                return True
+        if self.priorities and priority not in self.priorities:
+            return True
+        if self.categories and category not in self.categories:
+            return True
+        if self.bug_types and bug_type not in self.bug_types:
+            return True
+        if self.prefixes:
+            return not (bug_class.startswith(self.prefixes) or source_file.startswith(self.prefixes))
+        return False
+
+def bug_to_row(bug):
+    bug_type = bug.attrib.get("type","")
+    bug_priority = bug.attrib.get("priority","")
+    bug_rank = bug.attrib.get("rank","")
+    bug_category = bug.attrib.get("category","")
+
+    #Source location and taint metadata, from a single pass over the children
+    source_line = None
+    method = None
+    sink_method = ""
+    unknown_source = ""
+    for child in bug:
+        tag = child.tag
+        if tag == "SourceLine":
+            if source_line is None:
+                source_line = child
+        elif tag == "Method":
+            if method is None:
+                method = child
+        elif tag == "String":
+            role = child.get("role")
+            if role == "Sink method":
+                sink_method = child.get("value","")
+            elif role == "Unknown source":
+                unknown_source = child.get("value","")
+
+    bug_line = ""
+    bug_class = ""
+    bug_source = ""
+    if source_line is not None:
+        bug_line   = source_line.get("start","")
+        bug_class  = source_line.get("classname","")
+        bug_source = source_line.get("sourcepath","")
+
+    bug_method = ""
+    if method is not None:
+        bug_method = method.get("name","")
 
-def parse_spotbugs_report(filename,callback):
-
-    tree = ET.parse(filename)
-
-    for bug in tree.findall("BugInstance"):
-        bug_type = bug.attrib.get("type","")
-        bug_priority = bug.attrib.get("priority","")
-        bug_rank = bug.attrib.get("rank","")
-        bug_category = bug.attrib.get("category","")
-
-        #Source location metadata
-        bug_line = ""
-        bug_class = ""
-        bug_source = ""
-        source_lines = bug.findall("SourceLine")
-        if(len(source_lines) > 0):
-            bug_line   = source_lines[0].get("start","")
-            bug_class  = source_lines[0].get("classname","")
-            bug_source = source_lines[0].get("sourcepath","")
-
-        bug_method = ""
-        methods = bug.findall("Method")
-        if len(methods) > 0:
-            bug_method = methods[0].attrib.get("name","")
-
-        #Taint metadata
-        sink_method = ""
-        unknown_source = ""
-        strings = bug.findall("String")
-        for s in strings:
-            #print(s)
-            if("role" in s.attrib):
-                if(s.attrib["role"] == "Sink method"):
-                    sink_method = s.attrib["value"]
-                if(s.attrib["role"] == "Unknown source"):
-                    unknown_source = s.attrib["value"]
-
-        callback(["{}:{}".format(bug_source,bug_line),bug_class,bug_method,bug_type,bug_priority,bug_rank,bug_category,sink_method,unknown_source])
+    #Reports without instanceHash: the id is derived from the bug content
+    return bug_row(bug_source,bug_line,bug_class,bug_method,bug_type,bug_priority,bug_rank,bug_category,
+                   sink_method,unknown_source,bug_instance_id(bug))
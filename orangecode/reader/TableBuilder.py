@@ -0,0 +1,299 @@
+import array
+
+import numpy as np
+import scipy.sparse as sp
+from Orange.data import Table, Domain, ContinuousVariable, DiscreteVariable, StringVariable, MISSING_VALUES
+
+from orangecode.reader.Schema import DISCRETE, CONTINUOUS, STRING, ATTRIBUTE, CLASS, META
+
+
+class Column:
+    """
+    Growable storage for one column of a table with a known type.
+
+    Discrete values are interned as they arrive: `values` holds the distinct
+    values in order of appearance and `data` the code of each row's value
+    (-1 when missing). Continuous values go straight to a float array and
+    strings are kept as-is.
+
+    When built from an existing `variable`, its values keep their codes and
+    new values are appended after them instead of being sorted, so tables
+    built from the column are compatible with the variable's table.
+    """
+
+    def __init__(self, name, kind, role, variable=None):
+        self.name = name
+        self.kind = kind
+        self.role = role
+        self.base_variable = variable
+        self.values = list(variable.values) if kind == DISCRETE and variable is not None else []
+        self.index = {value: code for code, value in enumerate(self.values)}
+        if kind == DISCRETE:
+            self.data = array.array("l")
+        elif kind == CONTINUOUS:
+            self.data = array.array("d")
+        else:
+            self.data = []
+        self._bind()
+
+    def _bind(self):
+        if self.kind == DISCRETE:
+            self.append = self._append_discrete
+        elif self.kind == CONTINUOUS:
+            self.append = self._append_continuous
+        else:
+            self.append = self.data.append
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getstate__(self):
+        # Bound appenders are rebuilt on unpickling (builders cross process boundaries)
+        state = dict(self.__dict__)
+        state.pop("append")
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bind()
+
+    def _intern(self, values):
+        """Intern `values`; return the codes of their positions (-1 maps to -1)."""
+        remap = np.full(len(values) + 1, -1, dtype=self.data.typecode)
+        for code, value in enumerate(values):
+            new_code = self.index.get(value)
+            if new_code is None:
+                new_code = self.index[value] = len(self.values)
+                self.values.append(value)
+            remap[code] = new_code
+        return remap
+
+    def extend(self, other):
+        """Append the rows of another column of the same name and kind."""
+        if self.kind != DISCRETE:
+            self.data.extend(other.data)
+            return
+        remap = self._intern(other.values)
+        if len(other.data):
+            codes = np.frombuffer(other.data, dtype=other.data.typecode)
+            self.data.frombytes(remap[codes].tobytes())
+
+    def rebase(self, variable):
+        """
+        Make the column extend `variable`, as if it had been built from it:
+        the variable's values take their codes and the others follow.
+        """
+        self.base_variable = variable
+        if self.kind != DISCRETE:
+            return
+        values = self.values
+        self.values = list(variable.values)
+        self.index = {value: code for code, value in enumerate(self.values)}
+        remap = self._intern(values)
+        if len(self.data):
+            codes = np.frombuffer(self.data, dtype=self.data.typecode)
+            self.data = array.array(self.data.typecode, remap[codes].tobytes())
+
+    def _append_discrete(self, value):
+        if value in MISSING_VALUES:
+            self.data.append(-1)
+            return
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        self.data.append(code)
+
+    def _append_continuous(self, value):
+        if value in MISSING_VALUES:
+            self.data.append(np.nan)
+        else:
+            self.data.append(float(value))
+
+    def sorted_values(self):
+        """
+        Return the values sorted as Orange lists them (unless the column
+        extends a variable), and the codes of each row remapped to that order
+        (float, NaN for missing).
+        """
+        if self.base_variable is not None:
+            order = range(len(self.values))
+        else:
+            order = sorted(range(len(self.values)), key=self.values.__getitem__)
+        remap = np.empty(len(order) + 1)
+        remap[order] = np.arange(len(order))
+        remap[-1] = np.nan  # code -1 indexes the last slot
+        codes = np.frombuffer(self.data, dtype=self.data.typecode) if len(self.data) else np.empty(0, dtype=int)
+        return [self.values[i] for i in order], remap[codes]
+
+    def column_data(self):
+        """Return (values, 1-d array) ready to be placed in the table."""
+        if self.kind == DISCRETE:
+            return self.sorted_values()
+        if self.kind == CONTINUOUS:
+            return None, np.frombuffer(self.data, dtype=float) if len(self.data) else np.empty(0)
+        return None, np.array(self.data, dtype=object)
+
+    def variable(self, values=None):
+        if self.base_variable is not None and \
+                (self.kind != DISCRETE or len(values) == len(self.base_variable.values)):
+            return self.base_variable
+        if self.kind == DISCRETE:
+            return DiscreteVariable(self.name, values=values)
+        if self.kind == CONTINUOUS:
+            return ContinuousVariable(self.name)
+        return StringVariable(self.name)
+
+
+def _matching_variable(domain, name, kind):
+    if domain is None or name not in domain:
+        return None
+    var = domain[name]
+    if (kind == DISCRETE and var.is_discrete) or (kind == CONTINUOUS and var.is_continuous) or \
+            (kind == STRING and var.is_string):
+        return var
+    return None
+
+
+def _indicator_variables(name, values, domain):
+    """
+    Sparse indicator variables `name=value` of the values of a discrete
+    column, reused from `domain` when it has them.
+    """
+    variables = []
+    for value in values:
+        indicator = "{}={}".format(name, value)
+        var = _matching_variable(domain, indicator, CONTINUOUS)
+        variables.append(var or ContinuousVariable(indicator, number_of_decimals=0, sparse=True))
+    return variables
+
+
+def _one_hot(codes, n_values):
+    """CSR matrix with a 1 in the column of each row's code (no entry for NaN)."""
+    valid = ~np.isnan(codes)
+    indptr = np.zeros(len(codes) + 1, dtype=np.int64)
+    np.cumsum(valid, out=indptr[1:])
+    return sp.csr_matrix((np.ones(indptr[-1]), codes[valid].astype(np.int64), indptr),
+                         shape=(len(codes), n_values))
+
+
+def widen_sparse(X, domain, new_domain):
+    """
+    Sparse X of a table of `domain` laid out for `new_domain`, which has the
+    attributes of `domain` and possibly more (new indicator columns).
+    """
+    columns = np.array([new_domain.index(var.name) for var in domain.attributes], dtype=np.int64)
+    X = sp.csr_matrix(X)
+    return sp.csr_matrix((X.data, columns[X.indices], X.indptr), shape=(X.shape[0], len(new_domain.attributes)))
+
+
+def _same_variables(old, new):
+    return len(old) == len(new) and all(a is b for a, b in zip(old, new))
+
+
+class ColumnarTableBuilder:
+    """
+    Build an Orange Table column by column from rows of strings whose schema
+    is known in advance.
+
+    `columns` is a list of (name, kind, role) tuples matching the order of
+    the values in each row passed to `append`. If a `domain` is given, its
+    variables are reused (or extended with new values), and the domain itself
+    is returned when nothing new was seen.
+    """
+
+    def __init__(self, columns, domain=None):
+        self.domain = domain
+        self.columns = [Column(name, kind, role, _matching_variable(domain, name, kind))
+                        for name, kind, role in columns]
+        self._appenders = [column.append for column in self.columns]
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getstate__(self):
+        return {"columns": self.columns, "domain": self.domain}
+
+    def __setstate__(self, state):
+        self.columns = state["columns"]
+        self.domain = state["domain"]
+        self._appenders = [column.append for column in self.columns]
+
+    def append(self, row):
+        for append, value in zip(self._appenders, row):
+            append(value)
+
+    def extend(self, other):
+        """Append all rows of `other`, which must have the same columns."""
+        for column, other_column in zip(self.columns, other.columns):
+            column.extend(other_column)
+
+    def rebase(self, domain):
+        """
+        Reuse the variables of `domain`, extended with new values, as if the
+        builder had been created with it (see `__init__`).
+        """
+        self.domain = domain
+        for column in self.columns:
+            var = _matching_variable(domain, column.name, column.kind)
+            if var is not None:
+                column.rebase(var)
+
+    def to_table(self, sparse_columns=()):
+        """
+        Build the table. The discrete attributes named in `sparse_columns`
+        are one-hot encoded from their codes: X is then a CSR matrix with an
+        indicator column per value, and the discrete variables themselves
+        move to the metas.
+        """
+        n_rows = len(self)
+        places = {ATTRIBUTE: ([], []), CLASS: ([], []), META: ([], [])}
+        sparse = False
+
+        for column in self.columns:
+            values, data = column.column_data()
+            variable = column.variable(values)
+            if column.name in sparse_columns and column.kind == DISCRETE and column.role == ATTRIBUTE:
+                sparse = True
+                places[ATTRIBUTE][0].extend(_indicator_variables(column.name, values, self.domain))
+                places[ATTRIBUTE][1].append(_one_hot(data, len(values)))
+                places[META][0].append(variable)
+                places[META][1].append(data)
+                continue
+            variables, cols = places[column.role]
+            variables.append(variable)
+            cols.append(data)
+
+        def stack(cols, dtype):
+            out = np.empty((n_rows, len(cols)), dtype=dtype)
+            for i, col in enumerate(cols):
+                out[:, i] = col
+            return out
+
+        (attrs, Xcols), (clses, Ycols), (metas, Mcols) = \
+            places[ATTRIBUTE], places[CLASS], places[META]
+        if self.domain is not None and _same_variables(self.domain.attributes, attrs) and \
+                _same_variables(self.domain.class_vars, clses) and \
+                _same_variables(self.domain.metas, metas):
+            domain = self.domain
+        else:
+            domain = Domain(attrs, clses, metas)
+
+        if not n_rows:
+            if not sparse:
+                return Table.from_domain(domain, 0)
+            #Keep X sparse, so the table stacks with other sparse tables
+            return Table.from_numpy(domain,
+                                    sp.csr_matrix((0, len(attrs))),
+                                    stack(Ycols, float),
+                                    stack(Mcols, object))
+
+        if sparse:
+            X = sp.hstack([col if sp.issparse(col) else sp.csr_matrix(col.reshape(-1, 1))
+                           for col in Xcols], format="csr")
+        else:
+            X = stack(Xcols, float)
+        return Table.from_numpy(domain,
+                                X,
+                                stack(Ycols, float),
+                                stack(Mcols, object))
@@ -0,0 +1,44 @@
+"""
+Streaming iteration over the elements of the XML reports of PMD,
+Checkstyle and similar tools.
+"""
+import xml.etree.ElementTree as ET
+
+from orangecode.reader.ReportFiles import open_report
+
+def local_name(tag):
+    """Tag without its namespace ({http://pmd.sourceforge.net/report/2.0.0}file -> file)."""
+    return tag.rpartition("}")[2]
+
+def iter_xml_children(filename, parent, child, progress=None):
+    """
+    Yield (parent element, child element) for each `child` element of the
+    top-level `parent` elements of an XML report, ignoring namespaces. The
+    elements are discarded once the next one is requested. `filename` may
+    be a path (see ReportFiles.open_report) or a binary stream.
+    """
+    if hasattr(filename, "read"):
+        yield from _iter_xml_children(filename, parent, child)
+        return
+    source = open_report(filename, progress)
+    try:
+        yield from _iter_xml_children(source, parent, child)
+    finally:
+        source.close()
+
+def _iter_xml_children(source, parent, child):
+    context = ET.iterparse(source, events=("start", "end"))
+    _, root = next(context)
+    current = None
+    for event, elem in context:
+        tag = local_name(elem.tag)
+        if event == "start":
+            if tag == parent:
+                current = elem
+            continue
+        if tag == child and current is not None:
+            yield current, elem
+            current.remove(elem)
+        elif tag == parent:
+            current = None
+            root.clear()
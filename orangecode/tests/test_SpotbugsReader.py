@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from orangecode.reader.SpotbugsReader import SpotbugsReader
+
+BUG = '''  <BugInstance type="{type}" priority="2" rank="{rank}" category="SECURITY" instanceHash="{hash}"
+      instanceOccurrenceNum="0">
+    <Class classname="com.example.Class{cls}"><SourceLine classname="com.example.Class{cls}"
+      sourcepath="com/example/Class{cls}.java"/></Class>
+    <Method classname="com.example.Class{cls}" name="run"/>
+    <SourceLine classname="com.example.Class{cls}" start="{line}" end="{line}"
+      sourcepath="com/example/Class{cls}.java"/>
+  </BugInstance>
+'''
+
+
+def write_report(path, bugs):
+    """Write a SpotBugs report of `bugs`, dicts of the BUG fields."""
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<BugCollection version="4.7.3">\n')
+        for bug in bugs:
+            f.write(BUG.format(**bug))
+        f.write('</BugCollection>\n')
+
+
+def rows_by_id(table):
+    """Decoded values of every row of a report table, by BugId."""
+    variables = table.domain.attributes + table.domain.metas
+    bug_id = table.domain["BugId"]
+    return {row[bug_id]: tuple(str(row[var]) for var in variables) for row in table}
+
+
+class TestIncrementalRead(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.bugs = [dict(type="SQL_INJECTION", rank=i % 20 + 1, hash="{:032x}".format(i), cls=i % 7,
+                          line=100 + i) for i in range(50)]
+        self.path = os.path.join(self.directory, "report.xml")
+        write_report(self.path, self.bugs)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_same_as_full_read(self, removed_only=False, **options):
+        previous = SpotbugsReader(self.path, **options).read()
+        bugs = [dict(bug) for bug in self.bugs]
+        del bugs[10]
+        if not removed_only:
+            #One bug also moved and changed rank and one is new
+            bugs[3].update(line=1653, rank=9)
+            bugs.append(dict(type="PATH_TRAVERSAL_IN", rank=5, hash="f" * 32, cls=1, line=7))
+        write_report(self.path, bugs)
+
+        incremental = SpotbugsReader(self.path, **options).read_incremental(previous)
+        full = SpotbugsReader(self.path, **options).read()
+        self.assertEqual(len(incremental), len(full))
+        self.assertEqual(rows_by_id(incremental), rows_by_id(full))
+
+    def test_incremental_equals_full(self):
+        self.assert_same_as_full_read()
+
+    def test_incremental_equals_full_split_source(self):
+        self.assert_same_as_full_read(split_source=True)
+
+    def test_incremental_equals_full_sparse(self):
+        self.assert_same_as_full_read(sparse=True)
+        write_report(self.path, self.bugs)
+        self.assert_same_as_full_read(removed_only=True, sparse=True)